@@ -11,40 +11,7 @@ import pandas as pd
 import os
 import re
 
-
-def get_new_label(df):
-    """
-    Go though codes table, find re-used codes
-    """
-    label_dict = {}
-    codes_dict = {}
-
-    for old_label in df['Label'].unique():
-        # print(old_label)
-        df_codes = df.loc[(df.Label == old_label), ['codes_order', 'value', 'Category']].reset_index(drop=True)
-
-        # two values and each value is one word only
-        if (df_codes.shape[0] == 2) and ( all([ not pd.isnull(s) and len(s.split()) == 1 for s in df_codes['Category'].tolist()])):
-            #print("TWO")
-            new_label = 'cs_' + ('_').join(df_codes['Category'].tolist()) 
-
-        elif not bool(codes_dict):
-            #print("empty dict")
-            new_label = old_label
-
-        # already in codes value, no need to add again 
-        else:
-            new_label = old_label
-            for dict_label, dict_df in codes_dict.items():
-                if df_codes.equals(dict_df):
-                    new_label =  dict_label
-
-        label_dict[old_label] = new_label
-
-        if not new_label in codes_dict.keys():
-            codes_dict[new_label] = df_codes
-
-    return label_dict, codes_dict
+from codelists import dedupe_codelists
 
 
 def main():
@@ -58,10 +25,7 @@ def main():
     df_codes = df_codes.drop('Number', 1)
 
 
-    label_dict, codes_dict = get_new_label(df_codes)
-
-    df_codes_dict = pd.concat(codes_dict, axis=0).reset_index().drop('level_1', 1)
-    df_codes_dict.rename(columns={'level_0': 'Label'}, inplace=True)
+    label_dict, df_codes_dict = dedupe_codelists(df_codes, ['codes_order', 'value', 'Category'])
     df_codes_dict.to_csv(os.path.join(output_dir, 'codes.csv'), encoding='utf-8', sep=';', index=False)
 
     df_qg = pd.read_csv(os.path.join(input_dir, 'question_grids.csv'), sep=';')
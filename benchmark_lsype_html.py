@@ -0,0 +1,129 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Micro-benchmarks for lsype_html, run on synthetic questionnaire frames:
+        python benchmark_lsype_html.py
+    and a check that editing the table rules of lsype_html.py keeps the df_q cache key
+"""
+
+import os
+import shutil
+import tempfile
+import timeit
+import re
+import pandas as pd
+import numpy as np
+
+from lsype_questionnaire import apply_rules, apply_stages, question_rules
+from lsype_questionnaire import SOURCE_RULES, CONDITION_RULES, INSTRUCTION_RULES, RESPONSE_RULES, TYPE_TEXT_RULES
+from normalize_text import answer_label, normalize_all
+from lsype_cache import PARSER_MODULES, source_hash
+
+
+SAMPLE_TITLES = ['1. Yes', '2. No', 'No', "-1. Don't know", '-92. Refused', 'SHOW CARD A', 'Press 1 to continue',
+                 'ENTER DATE', 'DATETYPE', '- tick all', 'MULTICODED', 'INTERVIEWER: read out', 'CODE ALL THAT APPLY',
+                 'Open answer', 'Hours 0-50', '{ask all}', '{Ask if EthGrp = 3, 7 or 11}', '{Ask for each household member}',
+                 'loop ends', 'What is your name?', 'I would like to ask', '(If Repred = 1)', 'Numeric 1-18', 'Hdob',
+                 'look at this card', 'NOTE to interviewer', 'USING INTERPRETER', 'Qualb', '...and the other']
+SAMPLE_SOURCES = ['Standard', 'PlainText', 'listlevel1WW8Num', 'SequenceNumber', 'SectionNumber', 'QuestionText']
+
+
+def synthetic_frame(n=100000, seed=0):
+    """
+    random title/source frame with the kind of rows seen in the html exports
+    """
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({'sourceline': np.arange(n),
+                         'title': np.array(SAMPLE_TITLES, dtype=object)[rng.randint(len(SAMPLE_TITLES), size=n)],
+                         'source': np.array(SAMPLE_SOURCES, dtype=object)[rng.randint(len(SAMPLE_SOURCES), size=n)]})
+
+
+def rowwise_source_new(df):
+    return df.apply(lambda row: 'codelist' if ((row['title'][0].isdigit() == True or row['title'].startswith('-1') or row['title'].startswith('-92') or  row['title'] == 'No') and row['source'] in ['Standard', 'PlainText'])
+                                else 'codelist' if row['source'] == 'listlevel1WW8Num'
+                                else 'Instruction' if row['title'].lower().startswith('show')
+                                else 'Instruction' if row['title'].lower().startswith('press')
+                                else 'Instruction' if row['title'].lower().startswith('enter')
+                                else 'Instruction' if row['title'].lower().startswith('- ')
+                                else 'Instruction' if row['title'].lower().startswith('multicoded')
+                                else 'Instruction' if (len(row['title'].split(' ')) > 1 and row['source'] in ['Standard', 'PlainText'] and row['title'].split(' ')[0].upper() == row['title'].split(' ')[0] and not row['title'].startswith('{') and not row['title'].startswith('(') and not row['title'].startswith('*') and not row['title'].startswith('...') and not row['title'].startswith('I '))
+                                else 'Response' if row['title'].lower().startswith('open')
+                                else 'Response' if row['title'].lower().startswith('hours')
+                                else 'Standard' if 'ask all' in row['title']
+                                else row['source'], axis=1)
+
+
+def rowwise_response_source(new_df, question_list):
+    new_df = new_df.copy()
+    new_df['condition_source'] = new_df.apply(lambda row: 'Loop' if any(re.findall(r'loop repeats|loop ends|end loop|start loop|END OF AVCE LOOP|{Record for each|{Ask for each|{For each|{Ask for all', row['title'], re.IGNORECASE)) else 'Condition' if any(re.findall(r'Ask if|{|{If|{\(If|{ If|If claiming sickness|\(If Repred|\(If Ben1|\(IF HEPOSS9 = 1-3\)|If wrk1a', row['title'], re.IGNORECASE)) else row['source'], axis=1)
+    new_df['new_source'] = new_df.apply(lambda row: 'Instruction' if (((row['title'].isupper() == True and row['title'] not in('NOT USING INTERPRETER, MAIN PARENT ANSWERING QUESTIONS', 'USING INTERPRETER')) or 'INTERVIEWER' in row['title'] or 'Interviewer' in row['title'] or ('look at this card' in row['title']) or ('NOTE' in row['title']) or ('[STATEMENT]' in row['title']) ) and row['condition_source'] not in ['SequenceNumber', 'SectionNumber', 'Loop']) and 'DATETYPE' not in row['title'] else row['condition_source'], axis=1)
+    new_df['question_source'] = new_df.apply(lambda row: 'SectionNumber' if row['title'] in question_list else row['new_source'], axis=1)
+    return new_df.apply(lambda row: 'Response' if any(re.findall(r'Numeric|Open answer|Open type|OPEN ENDED|ENTER DATE|DATETYPE', row['title'], flags=re.IGNORECASE)) & ~(row['question_source'] in ('Instruction', 'Loop')) else row['question_source'], axis=1)
+
+
+def rowwise_type_text(new_df):
+    return new_df.apply(lambda row: 2 if row['source'] == 'Response' and row['title'] =='ENTER DATE' else 0, axis=1)
+
+
+def rowwise_title_m(df):
+    return df['title'].apply(lambda x: "-1. Don't know" if re.search(r"([0-9]*.*Don't know|don't know|Dont know|Dont Know|Don't Know|Don't know|DONT KNOW|DON'T KNOW).*", x) != None else '-92. Refused' if re.search(r'([0-9]*.*Refuse|refuse|REFUSE).*', x) != None else "99. Don't want to answer" if re.search(r"([0-9]*.*don't want to answer|Don't want to answer).*", x) != None else x)
+
+
+def cold_title_m(df):
+    # start from an empty cache so the timing includes the misses
+    answer_label.cache_clear()
+    return normalize_all(df['title'], answer_label)
+
+
+def bench(name, rowwise, vectorized, number=1, label='rule table'):
+    expected = rowwise()
+    actual = vectorized()
+    assert expected.equals(actual), '{}: {} differs from row-wise apply'.format(name, label)
+    t_row = timeit.timeit(rowwise, number=number) / number
+    t_vec = timeit.timeit(vectorized, number=number) / number
+    print('{:<16} row-wise {:8.3f}s  {:<10} {:8.3f}s  x{:.1f}'.format(name, t_row, label, t_vec, t_row / t_vec))
+
+
+def edited_source_hash(module, function):
+    """
+    source_hash of a copy of the modules with one line added to the start of function in module
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in set(PARSER_MODULES) | {module}:
+            shutil.copy(os.path.join(here, name), tmp)
+        path = os.path.join(tmp, module)
+        with open(path, 'rt') as f:
+            source = f.read()
+        marker = 'def {}('.format(function)
+        assert marker in source, '{} not in {}'.format(function, module)
+        with open(path, 'wt') as f:
+            f.write(source.replace(marker, '# edited\n' + marker, 1))
+        return source_hash(tmp)
+
+
+def check_cache_key():
+    here = os.path.dirname(os.path.abspath(__file__))
+    assert edited_source_hash('lsype_html.py', 'build_tables') == source_hash(here), 'editing build_tables changes the df_q cache key'
+    assert edited_source_hash('lsype_questionnaire.py', 'get_questionnaire') != source_hash(here), 'editing get_questionnaire keeps the df_q cache key'
+    print('cache key: kept when build_tables changes, new when get_questionnaire changes')
+
+
+def main():
+    check_cache_key()
+
+    df = synthetic_frame()
+    question_list = ['Hdob']
+    print('{} rows'.format(len(df)))
+
+    bench('source_new', lambda: rowwise_source_new(df), lambda: apply_rules(df, SOURCE_RULES))
+    bench('response_source',
+          lambda: rowwise_response_source(df, question_list),
+          lambda: apply_stages(df, [CONDITION_RULES, INSTRUCTION_RULES, question_rules(question_list), RESPONSE_RULES]))
+    bench('Type_text', lambda: rowwise_type_text(df), lambda: apply_rules(df, TYPE_TEXT_RULES, default=0))
+    bench('title_m', lambda: rowwise_title_m(df), lambda: cold_title_m(df), label='memoized')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Benchmark for parse_us_covid_xml, replays a synthetic DDI 3.3 instrument:
+        python benchmark_us_covid_xml.py
+        python benchmark_us_covid_xml.py --questions 5000
+        python benchmark_us_covid_xml.py --xml ../Jenny_ucl/us_covid19_xml/2020_07/UKHLSCovidJul20_v01.xml
+    the parse_* timings use --backend, the backend comparison reads the same xml with lxml and ElementTree
+"""
+
+import argparse
+import io
+import timeit
+import numpy as np
+import pandas as pd
+
+import parse_us_covid_xml as covid
+
+
+def ref(tag, ID, type_of_object):
+    return ('<{0}><r:Agency>uk.iser</r:Agency><r:ID>{1}</r:ID><r:Version>1</r:Version>'
+            '<r:TypeOfObject>{2}</r:TypeOfObject></{0}>').format(tag, ID, type_of_object)
+
+
+def text(tag, value):
+    return '<datacollection:{0}><datacollection:LiteralText><datacollection:Text>{1}</datacollection:Text></datacollection:LiteralText></datacollection:{0}>'.format(tag, value)
+
+
+def response_domain(rng, codelists):
+    """
+    a random response domain of a question item, with the labels and ranges seen in the covid instruments
+    """
+    k = rng.randint(10)
+    if k < 3:
+        attrs = ' maxLength="{}"'.format(rng.choice([50, 255])) if rng.randint(2) else ''
+        return '<datacollection:TextDomain{}></datacollection:TextDomain>'.format(attrs)
+    if k < 5:
+        high = '<r:NumberRange><r:Low>0</r:Low><r:High>{}</r:High></r:NumberRange>'.format(rng.choice([10, 99, 120])) if rng.randint(2) else ''
+        return '<datacollection:NumericDomain><r:NumericTypeCode>Integer</r:NumericTypeCode>{}</datacollection:NumericDomain>'.format(high)
+    if k < 6:
+        return '<datacollection:DateTimeDomain><r:Label><r:Content>dd/mm/yyyy</r:Content></r:Label><r:DateTypeCode>Date</r:DateTypeCode></datacollection:DateTimeDomain>'
+    return '<datacollection:CodeDomain>{}</datacollection:CodeDomain>'.format(ref('r:CodeListReference', codelists[rng.randint(len(codelists))], 'CodeList'))
+
+
+def synthetic_instrument(n=50000, seed=0):
+    """
+    DDI 3.3 xml with n question items and their question constructs in sequences of 20,
+    with a condition and a loop around every tenth sequence, code lists, statements and one question grid
+    """
+    rng = np.random.RandomState(seed)
+    fragments = []
+    add = lambda element: fragments.append('<ddi:Fragment>' + element + '</ddi:Fragment>')
+
+    categories = ['cat-{}'.format(i) for i in range(10)]
+    for i, ID in enumerate(categories):
+        add('<logicalproduct:Category><r:ID>{}</r:ID><r:Label><r:Content>Category {}</r:Content></r:Label></logicalproduct:Category>'.format(ID, i))
+
+    codelists = ['cl-{}'.format(i) for i in range(200)]
+    for i, ID in enumerate(codelists):
+        codes = ''.join('<logicalproduct:Code><r:CategoryReference><r:ID>{}</r:ID></r:CategoryReference><r:Value>{}</r:Value></logicalproduct:Code>'.format(categories[rng.randint(10)], v)
+                        for v in [1, 2, 3, -9][:2 + rng.randint(3)])
+        add('<logicalproduct:CodeList><r:ID>{}</r:ID><r:Label><r:Content>codes {}</r:Content></r:Label><logicalproduct:CodeListName><r:String>codes{}</r:String></logicalproduct:CodeListName>{}</logicalproduct:CodeList>'.format(ID, i, i, codes))
+
+    add('<datacollection:QuestionGrid><r:ID>qg-0</r:ID><datacollection:QuestionGridName><r:String>grid</r:String></datacollection:QuestionGridName>{}'
+        '<datacollection:NumericDomain><r:Label><r:Content>Hours number</r:Content></r:Label></datacollection:NumericDomain></datacollection:QuestionGrid>'.format(text('QuestionText', 'How many hours')))
+    add('<datacollection:QuestionConstruct><r:ID>qc-grid</r:ID><datacollection:ConstructName><r:String>grid</r:String></datacollection:ConstructName>{}</datacollection:QuestionConstruct>'.format(ref('r:QuestionReference', 'qg-0', 'QuestionGrid')))
+
+    sequences = []
+    refs = [('qc-grid', 'QuestionConstruct')]
+    for i in range(n):
+        name = 'q{}'.format(i)
+        add('<datacollection:QuestionItem><r:ID>qi-{0}</r:ID><datacollection:QuestionItemName><r:String>{1}</r:String></datacollection:QuestionItemName>{2}{3}'
+            '<r:ResponseCardinality minimumResponses="1" maximumResponses="1"/></datacollection:QuestionItem>'.format(i, name, text('QuestionText', 'What about ' + name), response_domain(rng, codelists)))
+        add('<datacollection:QuestionConstruct><r:ID>qc-{0}</r:ID><datacollection:ConstructName><r:String>qc_{1}</r:String></datacollection:ConstructName>{2}</datacollection:QuestionConstruct>'.format(i, name, ref('r:QuestionReference', 'qi-' + str(i), 'QuestionItem')))
+        refs.append(('qc-' + str(i), 'QuestionConstruct'))
+
+        if len(refs) == 20 or i == n - 1:
+            ID = 'seq-{}'.format(len(sequences))
+            if len(sequences) % 10 == 1:
+                refs.append(('st-' + ID, 'StatementItem'))
+                add('<datacollection:StatementItem><r:ID>st-{0}</r:ID><r:Label><r:Content>statement</r:Content></r:Label><datacollection:ConstructName><r:String>{0}</r:String></datacollection:ConstructName>{1}</datacollection:StatementItem>'.format(ID, text('DisplayText', 'Thinking about ' + name)))
+            add('<datacollection:Sequence><r:ID>{}</r:ID><r:Label><r:Content>{}</r:Content></r:Label>{}</datacollection:Sequence>'.format(
+                ID, ID, ''.join(ref('datacollection:ControlConstructReference', r, t) for r, t in refs)))
+            refs = []
+
+            if len(sequences) % 10 == 3:
+                add('<datacollection:IfThenElse><r:ID>if-{0}</r:ID><r:Label><r:Content>if {1}</r:Content></r:Label><datacollection:ConstructName><r:String>Condition{1}</r:String></datacollection:ConstructName>'
+                    '<datacollection:IfCondition><r:Command><r:CommandContent>IF {1} = 1</r:CommandContent></r:Command></datacollection:IfCondition>{2}</datacollection:IfThenElse>'.format(ID, name, ref('datacollection:ThenConstructReference', ID, 'Sequence')))
+                ID, kind = 'if-' + ID, 'IfThenElse'
+            elif len(sequences) % 10 == 6:
+                add('<datacollection:Loop><r:ID>loop-{0}</r:ID><r:Label><r:Content>loop {1}</r:Content></r:Label><datacollection:LoopWhile><r:Command><r:CommandContent>for each {1}</r:CommandContent></r:Command></datacollection:LoopWhile>{2}</datacollection:Loop>'.format(ID, name, ref('datacollection:ControlConstructReference', ID, 'Sequence')))
+                ID, kind = 'loop-' + ID, 'Loop'
+            else:
+                kind = 'Sequence'
+            sequences.append((ID, kind))
+
+    add('<datacollection:Sequence><r:ID>seq-main</r:ID><r:Label><r:Content>main</r:Content></r:Label>{}</datacollection:Sequence>'.format(
+        ''.join(ref('datacollection:ControlConstructReference', r, t) for r, t in sequences)))
+    add('<datacollection:Instrument><r:ID>inst-0</r:ID><r:Label><r:Content>Covid instrument</r:Content></r:Label>{}</datacollection:Instrument>'.format(ref('datacollection:ControlConstructReference', 'seq-main', 'Sequence')))
+    add('<studyunit:StudyUnit><r:Agency>uk.iser</r:Agency><r:ID>su-0</r:ID><r:Citation><r:Title><r:String>Covid study</r:String></r:Title></r:Citation>{}</studyunit:StudyUnit>'.format(ref('r:DataCollectionReference', 'dc-0', 'DataCollection')))
+    add('<datacollection:DataCollection><r:ID>dc-0</r:ID><r:Label><r:Content>Covid module</r:Content></r:Label><r:UserAttributePair><r:AttributeValue>["urn:ddi:uk.iser:inst-0:1"]</r:AttributeValue></r:UserAttributePair>'
+        '<datacollection:DataCollectionModuleName><r:String>covid</r:String></datacollection:DataCollectionModuleName></datacollection:DataCollection>')
+
+    namespaces = ' '.join('xmlns:{}="{}"'.format(k, v) for k, v in covid.ns.items())
+    return '<ddi:DDIInstance {}>{}</ddi:DDIInstance>'.format(namespaces, ''.join(fragments))
+
+
+def append_rows(rows, columns):
+    """
+    the old way: start from an empty frame and add one row at a time
+    """
+    df = pd.DataFrame(columns=columns)
+    for row in rows:
+        df.loc[len(df)] = list(row)
+    return df
+
+
+def bench_builder(rows, columns):
+    expected = append_rows(rows, columns)
+    actual = pd.DataFrame(rows, columns=columns, dtype=object)
+    assert expected.equals(actual), 'batched rows differ from row by row appends'
+    t_row = timeit.timeit(lambda: append_rows(rows, columns), number=1)
+    t_batch = timeit.timeit(lambda: pd.DataFrame(rows, columns=columns, dtype=object), number=1)
+    print('{:<24} {:>6} rows  row by row {:8.3f}s  batched {:8.3f}s  x{:.0f}'.format('QuestionConstruct rows', len(rows), t_row, t_batch, t_row / t_batch))
+
+
+PARSERS = [covid.parse_study, covid.parse_Instrument, covid.parse_category, covid.parse_codelist, covid.parse_response,
+           covid.parse_StatementItem, covid.parse_QuestionConstruct, covid.parse_QuestionItem, covid.parse_QuestionGrid,
+           covid.parse_IfThenElse, covid.parse_Loop, covid.parse_Sequence, covid.get_position]
+
+
+def extract(xml, backend):
+    """
+    read xml (bytes) with backend and run every parse_* function on it,
+    returns the seconds of reading, indexing and extraction and the tables
+    """
+    start = timeit.default_timer()
+    root = covid.read_xml(io.BytesIO(xml), backend)
+    read = timeit.default_timer()
+    store = covid.fragment_store(root)
+    indexed = timeit.default_timer()
+    tables = [parse(store) for parse in PARSERS]
+    return (read - start, indexed - read, timeit.default_timer() - indexed), tables
+
+
+def same_tables(a, b):
+    a = a if isinstance(a, tuple) else (a,)
+    b = b if isinstance(b, tuple) else (b,)
+    return all(x.equals(y) if isinstance(x, pd.DataFrame) else x == y for x, y in zip(a, b))
+
+
+def bench_backends(xml):
+    seconds = {}
+    tables = {}
+    for backend in covid.BACKENDS:
+        seconds[backend], tables[backend] = extract(xml, backend)
+        print('{:<24} read {:8.3f}s  fragment_store {:8.3f}s  extraction {:8.3f}s'.format(backend, *seconds[backend]))
+    assert all(same_tables(a, b) for a, b in zip(tables['lxml'], tables['etree'])), 'lxml and etree tables differ'
+    etree_total, lxml_total = sum(seconds['etree']), sum(seconds['lxml'])
+    print('{:<24} extraction x{:.1f}  total x{:.1f}'.format('etree / lxml', seconds['etree'][2] / seconds['lxml'][2], etree_total / lxml_total))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parse_us_covid_xml on a synthetic instrument')
+    parser.add_argument('--questions', type=int, default=50000, help='question items in the instrument')
+    parser.add_argument('--append-rows', type=int, default=5000, help='rows for the row by row append comparison')
+    parser.add_argument('--xml', help='a DDI 3.3 xml file instead of the synthetic instrument')
+    parser.add_argument('--backend', choices=covid.BACKENDS, default=covid.DEFAULT_BACKEND, help='xml library for the parse_* timings')
+    args = parser.parse_args()
+
+    if args.xml:
+        with open(args.xml, 'rb') as f:
+            xml = f.read()
+        print('{}, {:.1f} MB of xml'.format(args.xml, len(xml) / 1e6))
+    else:
+        xml = synthetic_instrument(args.questions).encode('utf-8')
+        print('{} question items, {:.1f} MB of xml'.format(args.questions, len(xml) / 1e6))
+
+    root = covid.read_xml(io.BytesIO(xml), args.backend)
+    start = timeit.default_timer()
+    store = covid.fragment_store(root)
+    print('{:<24} {:8.3f}s'.format('fragment_store', timeit.default_timer() - start))
+
+    # dependencies first, so each timing is the function's own work on top of the memoized ones
+    for parse in PARSERS:
+        start = timeit.default_timer()
+        result = parse(store)
+        seconds = timeit.default_timer() - start
+        df = result[0] if isinstance(result, tuple) else result
+        rows = len(df) if isinstance(df, pd.DataFrame) else len(result)
+        print('{:<24} {:8.3f}s  {} rows'.format(parse.__name__, seconds, rows))
+
+    qc = covid.parse_QuestionConstruct(store)
+    bench_builder(list(qc.head(args.append_rows).itertuples(index=False, name=None)), list(qc.columns))
+
+    bench_backends(xml)
+
+
+if __name__ == "__main__":
+    main()
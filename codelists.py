@@ -0,0 +1,59 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Re-use code lists: questions with the same codes share one code list
+    instead of one code list per question.
+    Each code list is reduced to a fingerprint (its ordered code rows) in one groupby,
+    identical code lists are then found with a dict lookup.
+"""
+
+import pandas as pd
+
+
+def fingerprint(rows):
+    """
+    ordered tuple of the code rows, NaN as None so that missing values compare equal
+    """
+    return tuple(tuple(None if v != v else v for v in row) for row in rows.itertuples(index=False, name=None))
+
+
+def dedupe_codelists(df, columns=None):
+    """
+    Go though codes table, find re-used codes
+        df: codes with a Label column, columns: code columns to compare (all others by default)
+    returns
+        label_map: old label -> new label
+        unique_codes: the kept code lists, Label first
+    Two codes with one word each are named after the words, e.g. cs_Yes_No,
+    otherwise a code list takes the label of the first identical one.
+    """
+    if columns is None:
+        columns = [c for c in df.columns if c != 'Label']
+
+    label_map = {}
+    codes_dict = {}
+    seen = {}
+
+    groups = {label: rows for label, rows in df.groupby('Label', sort=False)}
+    for old_label in df['Label'].unique():
+        df_codes = groups.get(old_label, df.iloc[0:0])[columns].reset_index(drop=True)
+        key = fingerprint(df_codes)
+
+        categories = df_codes['Category'].tolist()
+        # two values and each value is one word only
+        if len(categories) == 2 and all(not pd.isnull(s) and len(s.split()) == 1 for s in categories):
+            new_label = 'cs_' + '_'.join(categories)
+        # already in codes value, no need to add again
+        else:
+            new_label = seen.get(key, old_label)
+
+        label_map[old_label] = new_label
+
+        if new_label not in codes_dict:
+            codes_dict[new_label] = df_codes
+            seen.setdefault(key, new_label)
+
+    unique_codes = pd.concat(codes_dict, axis=0).reset_index().drop('level_1', axis=1)
+    unique_codes.rename(columns={'level_0': 'Label'}, inplace=True)
+    return label_map, unique_codes
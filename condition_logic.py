@@ -0,0 +1,121 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Translate LSYPE filter text into condition logic and labels, e.g.
+        {Ask if EthGrp = 3, 7, 11 or 16}
+    becomes
+        qc_EthGrp == 3 || qc_EthGrp == 7 || qc_EthGrp == 11 || qc_EthGrp == 16
+    with label c_qEthGrp (c_qEthGrp_i, c_qEthGrp_ii, ... when the name is used more than once).
+    Filter texts repeat a lot, each distinct text is translated once.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+import re
+
+from labeling import int_to_roman
+
+
+# question names in the filter text: Name = ..., Name > ..., Name < ...
+NAME_PATTERN = re.compile(r"(\w+) *(=|>|<)")
+# from the first ( to the last ) on the line
+BRACKET_PATTERN = re.compile(r'\((?<=\().*(?=\))\)')
+NUMBER_PATTERN = re.compile(r"(\d+)")
+JOIN_PATTERN = re.compile(r"(&&|\|\|)")
+COMPARE_PATTERN = re.compile(r"(\w+) *(==|!=)")
+
+# text replacements, in order
+OPERATORS = [('=', ' == '), ('<>', ' != '), (' OR ', ' || '), (' AND ', ' && '), (' or ', ' || '), (' and ', ' && '), ('{', ''), ('}', '')]
+
+Condition = namedtuple('Condition', ['names', 'first_name', 'stem', 'logic'])
+
+
+def remove_unmatched_parentheses(input_string):
+    """
+    Remove unmatched parentheses from a string:
+    all '(' when there are more '(' than ')', all ')' when there are more ')'
+    """
+    paren_depth = input_string.count('(') - input_string.count(')')
+    if paren_depth > 0:
+        return input_string.replace('(', '')
+    elif paren_depth < 0:
+        return input_string.replace(')', '')
+    return input_string
+
+
+@lru_cache(maxsize=None)
+def translate_condition(text):
+    """
+    Parse one filter text:
+        names: question names compared in the text, in order
+        first_name: the first of them, '' if none
+        stem: name for the label, also guessed from "... Name=..." when no name was found
+        logic: the comparison part rewritten with ==, !=, ||, && and qc_ before each name
+    """
+    names = tuple(name for name, _ in NAME_PATTERN.findall(text))
+    first_name = names[0] if names else ''
+
+    if first_name == '' and '=' in text:
+        stem = text.split('=')[0].strip().split(' ')[-1].replace('(', '').replace(')', '')
+    else:
+        stem = first_name
+
+    # the bracketed part, special case: "if a=b" without ()
+    m = BRACKET_PATTERN.search(text)
+    if m is not None:
+        logic = m.group()
+    elif first_name:
+        rest = text[text.index(first_name) + len(first_name):].split('\n', 1)[0]
+        logic = (first_name + rest).rstrip('}').rstrip(' ')
+    else:
+        logic = ''
+
+    for old, new in OPERATORS:
+        logic = logic.replace(old, new)
+    logic = remove_unmatched_parentheses(logic)
+
+    # reform logic: qc_EthGrp == 3, 7, 11, 14 || 16 will be qc_EthGrp == 3 || qc_EthGrp == 7 || qc_EthGrp == 14 || qc_EthGrp == 16
+    numbers = NUMBER_PATTERN.findall(logic)
+    joins = JOIN_PATTERN.findall(logic)
+    compares = COMPARE_PATTERN.findall(logic)
+    if joins and numbers and compares:
+        logic = (' ' + joins[0] + ' ').join([' '.join(compares[0]) + ' ' + s for s in numbers])
+
+    # add qc_ to all question names inside the logic
+    for name in names:
+        if name in logic:
+            logic = logic.replace(name, 'qc_' + name)
+
+    return Condition(names, first_name, stem, logic)
+
+
+def condition_stem(condition, next_question):
+    """
+    if can not parse (a=b), use the name of the NEXT question
+    """
+    if condition.first_name.isdigit() or condition.stem == '':
+        return next_question.strip()
+    return condition.stem.strip()
+
+
+@lru_cache(maxsize=None)
+def condition_label(stem, number, total):
+    """
+    c_q<stem>_<roman number>, without the suffix when the stem is used once
+    """
+    name = stem + '_' + str(number)
+    label = '_'.join([name.split('_')[0], int_to_roman(int(name.split('_')[1]))])
+    if total == 1:
+        label = label.strip('_i')
+    return 'c_q' + label
+
+
+def condition_labels(stems):
+    """
+    labels for a Series of stems, numbered in order within each stem
+    """
+    groups = stems.groupby(stems)
+    totals = groups.transform('count')
+    numbers = groups.cumcount() + 1
+    return [condition_label(stem, number, total) for stem, number, total in zip(stems, numbers, totals)]
@@ -0,0 +1,71 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Intermediate frames written for debugging (DF.csv, df_parent.csv, ...), off by default.
+    Switch stages on with the LSYPE_DEBUG environment variable or enable(), e.g.
+        LSYPE_DEBUG=parents,sequences python parse_lsype.py --wave 1
+        LSYPE_DEBUG=all python parse_wave8_pdf.py
+    stages: parse, sequences, parents (lsype_html.py), questions, positions (parse_wave8_pdf.py),
+    loops (understanding_society.py, wave 5 loop labels).
+    Enabled frames are copied and written as gzipped csv (<name>.gz) by one background thread,
+    flush() waits for the pending writes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+
+ENV_VAR = 'LSYPE_DEBUG'
+
+_executor = None
+_pending = []
+
+
+def stages():
+    """
+    enabled stage names, 'all' enables every stage
+    """
+    value = os.environ.get(ENV_VAR, '')
+    return set(s.strip() for s in value.split(',') if s.strip())
+
+
+def enable(names):
+    """
+    switch stages on for this process and the processes it starts
+    """
+    names = stages() | set(names)
+    os.environ[ENV_VAR] = ','.join(sorted(names))
+
+
+def is_enabled(stage):
+    names = stages()
+    return stage in names or 'all' in names
+
+
+def _write(df, path, kwargs):
+    df.to_csv(path + '.gz', compression='gzip', **kwargs)
+
+
+def dump(stage, df, path, **kwargs):
+    """
+    write df to path.gz in the background when stage is enabled, kwargs are passed to to_csv
+    """
+    global _executor
+    if not is_enabled(stage):
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='debug-artifacts')
+    _pending.append((path, _executor.submit(_write, df.copy(), path, kwargs)))
+
+
+def flush():
+    """
+    wait for the pending writes, a failed write is reported but does not stop the run
+    """
+    while _pending:
+        path, future = _pending.pop(0)
+        try:
+            future.result()
+        except Exception as e:
+            print('debug artifact {} not written: {}'.format(path, e))
@@ -10,63 +10,9 @@ import pandas as pd
 import numpy as np
 import os
 
-
-def isNaN(num):
-    return num != num
-
-
-def find_parent(start, stop, df_mapping, source, section_label):
-    """
-        Find the parent label and parent source
-    """
-    if isNaN(stop):
-        df = df_mapping.loc[(df_mapping.start_position < start) & (df_mapping.end_position > start), :]
-    else:
-        df = df_mapping.loc[(df_mapping.start_position < start) & (df_mapping.end_position > stop), :]
-
-    if source == 'Sequences':
-        return section_label
-    elif not df.empty:
-        df['dist'] = start - df['start_position']
-        df_r = df.loc[df['dist'].idxmin()]
-        return df_r['Label']
-    else:
-        return section_label
-
-
-def get_new_label(df):
-    """
-        Go though codes table, find re-used codes
-    """
-    label_dict = {}
-    codes_dict = {}
-
-    for old_label in df['Label'].unique():
-        # print(old_label)
-        df_codes = df.loc[(df.Label == old_label), ['Code_Order', 'Code_Value', 'Category']].reset_index(drop=True)
-
-        # two values and each value is one word only
-        if (df_codes.shape[0] == 2) and ( all([ not pd.isnull(s) and len(s.split()) == 1 for s in df_codes['Category'].tolist()])):
-            #print("TWO")
-            new_label = 'cs_' + ('_').join(df_codes['Category'].tolist()) 
-
-        elif not bool(codes_dict):
-            #print("empty dict")
-            new_label = old_label
-
-        # already in codes value, no need to add again 
-        else:
-            new_label = old_label
-            for dict_label, dict_df in codes_dict.items():
-                if df_codes.equals(dict_df):
-                    new_label =  dict_label
-
-        label_dict[old_label] = new_label
-
-        if not new_label in codes_dict.keys():
-            codes_dict[new_label] = df_codes
-
-    return label_dict, codes_dict
+from nesting import assign_parents
+from labeling import suffix_duplicates
+from codelists import dedupe_codelists
 
 
 def update_codelist(df_codelist, df_qi):
@@ -74,9 +20,7 @@ def update_codelist(df_codelist, df_qi):
         Update codelist, one codelist can be used for multiple questions
     """
 
-    label_dict, codes_dict = get_new_label(df_codelist)
-    df_codes_dict = pd.concat(codes_dict, axis=0).reset_index().drop('level_1', 1)
-    df_codes_dict.rename(columns={'level_0': 'Label'}, inplace=True)
+    label_dict, df_codes_dict = dedupe_codelists(df_codelist, ['Code_Order', 'Code_Value', 'Category'])
 
     df_qi['Response_domain'].update(pd.Series(label_dict))
 
@@ -153,7 +97,7 @@ def main():
     df_questions['Label'] = df_questions['Label'].str.replace('qc_', 'qi_')
 
     # deal with same Label name
-    df_questions['Label'] = df_questions['Label'] + '_' + df_questions.groupby('Label').cumcount().astype(str)
+    df_questions['Label'] = suffix_duplicates(df_questions['Label'], start=0, number=str, keep_single=False)
     df_questions['Label'] = df_questions['Label'].str.replace('_0', '')
 
     # sort by column "Number"
@@ -218,13 +162,15 @@ def main():
     df_mapping = df_all_new.loc[ df_all['end_position'] > 0, ['Label', 'source', 'start_position', 'end_position']]
 
     # find above label
-    for index,row in df_all_new.iterrows():
-        df_all_new.at[index, 'parent_name'] = find_parent(row['start_position'], row['end_position'], df_mapping, row['source'], row['section_label'])
+    parent_name, parent_type, position = assign_parents(df_all_new['start_position'], df_all_new['end_position'], df_all_new['section_label'],
+                                                        df_all_new['source'] == 'Sequences',
+                                                        df_mapping['start_position'], df_mapping['end_position'], df_mapping['Label'])
+    df_all_new['parent_name'] = parent_name
 
     # calculate position
-    df_all_new['Position'] = df_all_new.groupby('parent_name').cumcount() + 1
+    df_all_new['Position'] = position
 
-    df_all_new['parent_type'] = df_all_new['parent_name'].apply(lambda x: 'CcCondition' if x[0:1] == 'c'  else 'CcLoop' if x[0:1] == 'l' else 'CcSequence')
+    df_all_new['parent_type'] = parent_type
 
     df_all_new['Branch'] = df_all_new.apply(lambda row: dict_if_branch[row['parent_name']] if row['parent_type'] == 'CcCondition' else 1, axis=1)
 
@@ -0,0 +1,74 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Unique labels shared by the parsers:
+        - int_to_roman: cached roman numbers used as label suffixes (1 -> i, 2 -> ii, ...)
+        - unique_labeler: k the first time it is seen, then k_i, k_ii, ...
+        - suffix_duplicates: number the labels within each group in one vectorized pass
+"""
+
+from collections import Counter, OrderedDict
+from functools import lru_cache
+import pandas as pd
+
+
+ROMAN = OrderedDict([(1000, "m"), (900, "cm"), (500, "d"), (400, "cd"),
+                     (100, "c"), (90, "xc"), (50, "l"), (40, "xl"),
+                     (10, "x"), (9, "ix"), (5, "v"), (4, "iv"), (1, "i")])
+
+
+@lru_cache(maxsize=None)
+def int_to_roman(num):
+    """
+    Convert integer to roman numeral, "0" for 0
+    """
+    if num == 0:
+        return "0"
+    chunks = []
+    for r, letters in ROMAN.items():
+        x, num = divmod(num, r)
+        chunks.append(letters * x)
+        if num <= 0:
+            break
+    return "".join(chunks)
+
+
+def unique_labeler():
+    """
+    Returns label(k): k if it was not returned before, else the first free of k_i, k_ii, ...
+    A counter keeps the next suffix of each k, so a key is not probed from _i again on every collision
+    """
+    used = set()
+    counts = Counter()
+
+    def label(k):
+        n = counts[k]
+        kk = k if n == 0 else k + '_' + int_to_roman(n)
+        while kk in used:
+            n += 1
+            kk = k + '_' + int_to_roman(n)
+        counts[k] = n + 1
+        used.add(kk)
+        return kk
+
+    return label
+
+
+def suffix_duplicates(labels, keys=None, start=1, number=int_to_roman, sep='_', keep_single=True, keep_first=False):
+    """
+    label + sep + number of the row within its group (groups of keys, labels by default), counting from start
+        keep_single: labels of groups with one row are left as they are
+        keep_first: the first row of each group is left as it is
+    """
+    labels = pd.Series(labels)
+    keys = labels if keys is None else pd.Series(list(keys), index=labels.index)
+    groups = keys.groupby(keys)
+    numbers = groups.cumcount() + start
+
+    out = labels + sep + numbers.map(number)
+    if keep_single:
+        out = out.where(groups.transform('count') > 1, labels)
+    if keep_first:
+        out = out.where(numbers != start, labels)
+    return out
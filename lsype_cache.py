@@ -0,0 +1,180 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    On-disk cache of the parsed per-file questionnaire frames (df_q) of the LSYPE html parsers.
+    An entry is keyed by
+        - the sha256 of the html file
+        - the settings of the wave/file that change df_q
+        - the source of the modules that build df_q (lsype_questionnaire.py, normalize_text.py),
+          so editing the html parser invalidates old entries while editing the table rules of lsype_html.py does not
+    Frames are stored as feather when pyarrow is installed, pickle otherwise (both keep the dtypes),
+    with a small json file used to check the entry before it is returned.
+    The least recently used entries are removed once the cache is over max_bytes.
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 (feather support)
+    FRAME_FORMAT = 'feather'
+except ImportError:
+    FRAME_FORMAT = 'pkl'
+
+
+# bump when the entry format written by store_frame changes
+CACHE_VERSION = 1
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# modules whose code decides what df_q looks like
+PARSER_MODULES = ['lsype_questionnaire.py', 'normalize_text.py']
+
+# config entries that change df_q
+CONFIG_KEYS = ['elements', 'question_list', 'drop_empty_titles', 'html_encoding']
+
+_parser_version = None
+
+
+def source_hash(source_dir):
+    """
+    hash of the PARSER_MODULES in source_dir
+    """
+    h = hashlib.sha256(str(CACHE_VERSION).encode())
+    for name in PARSER_MODULES:
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def parser_version():
+    """
+    hash of the parser source, computed once per process
+    """
+    global _parser_version
+    if _parser_version is None:
+        _parser_version = source_hash(os.path.dirname(os.path.abspath(__file__)))
+    return _parser_version
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(html_path, config, idx):
+    """
+    key of the df_q of the idx-th html file of a wave
+    """
+    settings = {k: config.get(k) for k in CONFIG_KEYS}
+    settings['file'] = config['files'][idx]
+    settings['idx'] = idx
+    h = hashlib.sha256()
+    h.update(file_hash(html_path).encode())
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    h.update(parser_version().encode())
+    return h.hexdigest()
+
+
+def _paths(cache_dir, key):
+    base = os.path.join(cache_dir, key)
+    return base + '.' + FRAME_FORMAT, base + '.json'
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _describe(df):
+    return {'rows': len(df),
+            'columns': [str(c) for c in df.columns],
+            'dtypes': [str(t) for t in df.dtypes],
+            'index': str(df.index.dtype)}
+
+
+def load_frame(cache_dir, key):
+    """
+    cached df_q for key, None when there is no valid entry (a broken entry is removed)
+    """
+    data_path, meta_path = _paths(cache_dir, key)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, 'rt') as f:
+            meta = json.load(f)
+        if FRAME_FORMAT == 'feather':
+            df = pd.read_feather(data_path)
+            df = df.set_index('__index__')
+            df.index.name = None
+        else:
+            df = pd.read_pickle(data_path)
+    except Exception:
+        _remove(data_path, meta_path)
+        return None
+
+    if meta.get('key') != key or meta.get('frame') != _describe(df):
+        _remove(data_path, meta_path)
+        return None
+
+    # mark as recently used
+    os.utime(data_path)
+    return df
+
+
+def store_frame(cache_dir, key, df, max_bytes=MAX_CACHE_BYTES):
+    """
+    write df_q for key, then evict old entries above max_bytes
+    """
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    data_path, meta_path = _paths(cache_dir, key)
+
+    # write to temporary files and rename, parallel workers never see half written entries
+    tmp_path = data_path + '.{}.tmp'.format(os.getpid())
+    if FRAME_FORMAT == 'feather':
+        out = df.copy()
+        out.index.name = '__index__'
+        out.reset_index().to_feather(tmp_path)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, data_path)
+
+    tmp_path = meta_path + '.{}.tmp'.format(os.getpid())
+    with open(tmp_path, 'wt') as f:
+        json.dump({'key': key, 'frame': _describe(df)}, f)
+    os.replace(tmp_path, meta_path)
+
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir, max_bytes=MAX_CACHE_BYTES):
+    """
+    remove the least recently used entries until the cache fits in max_bytes
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.' + FRAME_FORMAT):
+            continue
+        data_path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(data_path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, data_path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, data_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(data_path, os.path.splitext(data_path)[0] + '.json')
+        total -= size
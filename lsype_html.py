@@ -0,0 +1,730 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Shared engine for the LSYPE html parsers (parse_wave*_html.py),
+    the differences between waves live in lsype_config/wave<N>.json,
+    the per file frames (df_q) come from lsype_questionnaire.py
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+import json
+import os
+import re
+
+from lsype_questionnaire import parse_html_file
+from lsype_cache import cache_key, load_frame, store_frame, MAX_CACHE_BYTES
+from condition_logic import translate_condition, condition_stem, condition_labels
+from nesting import assign_parents
+import debug_artifacts
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lsype_config')
+
+
+def next_labels(labels, prefix='statement', target='qi_'):
+    """
+    map each label starting with prefix to the next label (itself included) starting with target,
+    one reverse sweep instead of rescanning the rest of the list for every label
+    """
+    labels = list(labels)
+    following = [None] * len(labels)
+    seen = None
+    for i in range(len(labels) - 1, -1, -1):
+        if labels[i].startswith(target):
+            seen = labels[i]
+        following[i] = seen
+
+    d = {}
+    for label, next_label in zip(labels, following):
+        if label.startswith(prefix) and next_label is not None:
+            d[label] = next_label
+    return d
+
+
+def statement_names(labels):
+    """
+    Label statements after the next question e.g, statement_1 label would be s_qSHGInt,
+    second statement before the same question is s_qSHGInt_1 and so on
+    returns {old statement label: new label}
+    """
+    counts = {}
+    d = {}
+    for old_name, question_item_name in next_labels(labels).items():
+        question_name = question_item_name.split('_')[-1]
+        n = counts.get(question_name, 0)
+        counts[question_name] = n + 1
+        d[old_name] = 's_q' + question_name if n == 0 else 's_q' + question_name + '_' + str(n)
+    return d
+
+
+def next_marker(positions, markers):
+    """
+    scope ends at the next marker:
+    for each position the smallest marker strictly after it, NaN when there is none
+    markers are sorted once and looked up with searchsorted, O(n log k)
+    """
+    markers = np.sort(np.asarray(markers, dtype=float))
+    positions = np.asarray(positions, dtype=float)
+    idx = np.searchsorted(markers, positions, side='right')
+    found = idx < len(markers)
+    end = np.full(len(positions), np.nan)
+    end[found] = markers[idx[found]]
+    return end
+
+
+def f(string, match):
+    """
+    Find a word containts '/' in a string
+    """
+    string_list = [s for s in string.split(' ') if '/' in s]
+    match_list = []
+    for word in string_list:
+        if match in word:
+            match_list.append(word)
+    return match_list[0]
+
+
+def question_summary(df):
+    """
+    Per question aggregates shared by get_question_items and get_question_grids,
+    the rows are split by source once:
+        - questions: sourceline, questions, Interviewee, Literal, Instructions of each question
+          (its Standard and Instruction lines joined by new lines, one grouped pass for both)
+        - responses: codelist name (cs_q...) and Response lines of each question
+        - codes: codelist rows
+    """
+    parts = {source: rows for source, rows in df.groupby('source', sort=False)}
+    empty = df.iloc[0:0]
+
+    text = pd.concat([parts.get('Standard', empty), parts.get('Instruction', empty)])
+    if text.empty:
+        df_text = pd.DataFrame(columns=['questions', 'Literal', 'Instructions'])
+    else:
+        df_text = text.groupby(['questions', 'source'])['title'].apply('\n'.join).unstack('source')
+        df_text = df_text.reindex(columns=['Standard', 'Instruction']).reset_index()
+        df_text.columns = ['questions', 'Literal', 'Instructions']
+
+    df_questions = parts.get('SectionNumber', empty)[['sourceline', 'questions', 'Interviewee']]
+    df_questions = df_questions.merge(df_text, how='left', on='questions')
+
+    # 1. codelist
+    df_codes = parts.get('codelist', empty)
+    df_question_code = df_codes[['questions']].drop_duplicates()
+    df_question_code['Response'] = 'cs_q' + df_question_code['questions']
+
+    # 2. Response
+    df_question_response = parts.get('Response', empty)[['questions', 'title']].drop_duplicates()
+    df_question_response.rename(columns={'title': 'Response'}, inplace=True)
+
+    return {'questions': df_questions,
+            'responses': pd.concat([df_question_code, df_question_response]),
+            'codes': df_codes}
+
+
+def get_question_grids(df, summary=None):
+    """
+    Build questions table
+        - sourceline
+        - Label
+        - Literal
+        - Instructions
+        - horizontal_code_list_name
+        - vertical_code_list_name
+        - source
+    summary: question_summary of the rows with a title
+    """
+    df = df[df.title != '']
+    if summary is None:
+        summary = question_summary(df)
+
+    df_question_grids = summary['questions'][['sourceline', 'questions', 'Literal', 'Instructions']].copy()
+    df_question_grids['vertical_code_list_name'] = 'cs_vertical_' + df_question_grids['questions']
+    df_question_grids['horizontal_code_list_name'] = 'cs_horizontal_' + df_question_grids['questions']
+    df_question_grids['Label'] = 'qg_' + df_question_grids['questions']
+    df_question_grids = df_question_grids[['Label', 'Literal', 'Instructions', 'horizontal_code_list_name', 'vertical_code_list_name', 'sourceline']]
+
+    df_qg_codelist = summary['codes'][['questions', 'sourceline', 'title', 'seq']]
+    df_qg_codelist = df_qg_codelist.sort_values(['sourceline', 'seq'])
+    df_qg_size = df.groupby(['sourceline']).size().reset_index(name='counts')
+    df_qg_codelist_size = df_qg_codelist.merge(df_qg_size, how='left', on='sourceline')
+
+    # vertical code
+    df_qg_vertical = df_qg_codelist_size.loc[(df_qg_codelist_size['counts'] == 2), :]
+    df_qg_vertical.loc[df_qg_vertical['seq'] == 3, ['seq']] = 2
+
+    df_qg_vertical['vertical_code_list_name'] = 'cs_vertical_' + df_qg_vertical['questions']
+    df_qg_vertical.drop(['questions', 'counts'], axis=1, inplace=True)
+    df_qg_vertical.rename(columns={'title': 'Category', 'sourceline':'Number', 'seq': 'codes_order', 'vertical_code_list_name': 'Label'}, inplace=True)
+    df_qg_vertical['value'] = df_qg_vertical['codes_order']
+    df_qg_vertical = df_qg_vertical[['Number', 'codes_order', 'Label', 'value', 'Category']]
+
+    # horizontal code
+    df_qg_horizontal = df_qg_codelist_size.loc[(df_qg_codelist_size['counts'] != 2), :]
+
+    df_qg_horizontal['horizontal_code_list_name'] = 'cs_horizontal_' + df_qg_horizontal['questions']
+    df_qg_horizontal.drop(['questions', 'counts'], axis=1, inplace=True)
+    df_qg_horizontal.rename(columns={'title': 'Category', 'sourceline':'Number', 'seq': 'codes_order', 'horizontal_code_list_name': 'Label'}, inplace=True)
+    df_qg_horizontal['value'] = df_qg_horizontal['codes_order']
+    df_qg_horizontal = df_qg_horizontal[['Number', 'codes_order', 'Label', 'value', 'Category']]
+
+    df_qg_codes = df_qg_vertical.append(df_qg_horizontal, ignore_index=True)
+    df_qg_codes['codes_order'] = df_qg_codes['codes_order'].astype(int)
+    df_qg_codes['value'] = df_qg_codes['value'].astype(int)
+
+    return df_question_grids, df_qg_codes
+
+
+def get_question_items(df, summary=None):
+    """
+    Build questions table
+        - Label
+        - Literal
+        - Instructions
+        - Response domain
+        - above_label
+        - parent_type
+        - branch
+        - Position
+    summary: question_summary of df
+    """
+    if summary is None:
+        summary = question_summary(df)
+
+    # each question with its literal and instructions
+    # ignore footnote for now, it could be 'instruction'
+    # responds: codelist and Response
+    df_question_all = pd.merge(summary['questions'], summary['responses'], how='left', on=['questions'])
+
+
+    # all questions
+    df_question_all.sort_values(by=['sourceline'], inplace=True)
+
+    df_question_all['source'] = 'question'
+    df_question_all['Label'] = 'qi_' + df_question_all['questions']
+    # df_question_all['Label'] = df_question_all.groupby('questions').questions.apply(lambda n: 'qi_' + n.str.strip() + '_' + (np.arange(len(n))).astype(str))
+    # df_question_all['Label'] = df_question_all['Label'].str.strip('_0')
+
+    df_question_all = df_question_all.drop_duplicates(subset=['Label', 'Response'], keep='first')
+    # rd_order: codelist last for mixed response
+    df_question_all = df_question_all.sort_values(by=['Label', 'Response'], ascending=False)
+
+    # add response order, responses are unique and already in descending order within each label
+    df_question_all['rd_order'] = df_question_all.groupby('Label').cumcount() + 1
+    #df_question_all.to_csv('tmp_qi.csv')
+    # request 3: If there is no question literal, can we add the instruction text to the literal instead
+    # remove it from instruction afterwards
+    df_question_all.loc[df_question_all['Literal'].isnull(), 'Literal'] = df_question_all['Instructions']
+    df_question_all.loc[df_question_all['Literal'] == df_question_all['Instructions'], 'Instructions'] = None
+
+    return df_question_all
+
+
+def get_conditions(df):
+    """
+    Build conditions table, the logic and label stem of each distinct filter text are translated once
+    """
+
+    # if can not parse (a=b), use the name of the NEXT question
+    df['next_question'] = df['questions'].shift(-1)
+
+    df_conditions = df.loc[(df.source == 'Condition'), ['sourceline', 'questions', 'title', 'condition_end', 'next_question']]
+
+    conditions = [translate_condition(text) for text in df_conditions['title']]
+    df_conditions['Logic_name3'] = [condition_stem(condition, next_question) for condition, next_question in zip(conditions, df_conditions['next_question'])]
+    df_conditions['Label'] = condition_labels(df_conditions['Logic_name3'])
+    df_conditions['Logic'] = [condition.logic for condition in conditions]
+
+    df_conditions.rename(columns={'title': 'Literal'}, inplace=True)
+
+    return df_conditions
+
+
+def get_loops(df, rows):
+    """
+    Build loops table manually:
+        rows are the hard coded [Label, Variable, Start Value, End Value, Loop While, Logic] of one wave
+    """
+    df_sub = df.loc[(df.source == 'Loop'), ['sourceline', 'title']]
+
+    col_names =  ['Label', 'Variable', 'Start Value', 'End Value', 'Loop While', 'Logic']
+    df_loops  = pd.DataFrame(columns = col_names)
+
+    for row in rows:
+        df_loops.loc[len(df_loops)] = row
+
+    return df_loops
+
+
+def get_statements(df):
+    """
+        Create Statement table: Label,above_label,parent_type,branch,Position,Literal
+
+    """
+    df_statement = df.loc[:, ['title', 'sourceline']].reset_index()
+    df_statement.rename(columns={'title': 'Literal'}, inplace=True)
+    df_statement['ind'] = df_statement.index + 1
+    df_statement['Label'] = 'statement_' + df_statement['ind'].astype(str)
+    df_statement = df_statement.drop('ind', 1)
+
+    return df_statement
+
+
+def load_config(wave, config_dir=CONFIG_DIR):
+    """
+    Read the per wave settings from lsype_config/wave<N>.json
+    """
+    with open(os.path.join(config_dir, 'wave{}.json'.format(wave)), 'rt') as f:
+        return json.load(f)
+
+
+def parse_file(config, idx):
+    """
+    df_q of the idx-th html file of one wave, from the cache when the html file,
+    its settings and the parser are unchanged (config['cache'] = False turns the cache off)
+    """
+    input_dir = config['input_dir']
+    htmlFile = os.path.join(input_dir, config['files'][idx]['html'])
+
+    use_cache = config.get('cache', True)
+    if use_cache:
+        cache_dir = config.get('cache_dir') or os.path.join(input_dir, 'cache')
+        key = cache_key(htmlFile, config, idx)
+        df_q = load_frame(cache_dir, key)
+    else:
+        df_q = None
+
+    if df_q is None:
+        df_q = parse_html_file(htmlFile, config, idx)
+        if use_cache:
+            store_frame(cache_dir, key, df_q, config.get('cache_max_bytes', MAX_CACHE_BYTES))
+
+    return df_q
+
+
+def parse_files(config, workers=None):
+    """
+    Parse all html files of one wave and concatenate them in file order
+    """
+    return parse_waves([config], workers)[0]
+
+
+def parse_waves(configs, workers=None):
+    """
+    Parse the html files of several waves, one task per file so a batch run spreads
+    files and waves over a process pool when workers is not 1 (0 means one per cpu).
+    executor.map keeps the task order, so each wave is concatenated in file order
+    and the output is the same as a serial run.
+    """
+    tasks = [(config, idx) for config in configs for idx in range(len(config['files']))]
+    if workers is not None and workers != 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers or None) as executor:
+            results = list(executor.map(parse_file, *zip(*tasks)))
+    else:
+        results = [parse_file(config, idx) for config, idx in tasks]
+
+    # dumped here and not in parse_file, pool workers exit before a background write is done
+    for (config, idx), df_q in zip(tasks, results):
+        debug_artifacts.dump('parse', df_q, os.path.join(config['input_dir'], '{}.csv'.format(idx)), sep= ';', encoding = 'utf-8', index=False)
+
+    frames = []
+    start = 0
+    for config in configs:
+        stop = start + len(config['files'])
+        frames.append(pd.concat(results[start:stop]))
+        start = stop
+    return frames
+
+
+def manual_fix(df, ops):
+    """
+    Apply the manual fixes of one wave, in order:
+        ["set", new_sourceline, column, value]
+        ["drop", new_sourceline]
+        ["add", row]
+        ["sort", columns] or ["sort", columns, true] to also reset the index
+    plain strings are comments
+    """
+    for op in ops:
+        if isinstance(op, str):
+            continue
+        if op[0] == 'set':
+            df.loc[df['new_sourceline'] == op[1], [op[2]]] = op[3]
+        elif op[0] == 'drop':
+            df = df[df.new_sourceline != op[1]]
+        elif op[0] == 'add':
+            df.loc[len(df)] = op[1]  # adding a row
+        elif op[0] == 'sort':
+            df = df.sort_values(op[1])
+            if len(op) > 2 and op[2]:
+                df = df.reset_index(drop=True)
+        else:
+            raise ValueError('unknown manual fix: {}'.format(op))
+    return df
+
+
+def run(config, workers=None):
+    """
+    Parse one wave and write the pipeline csv files to input_dir/output_dir
+    """
+    run_waves([config], workers)
+
+
+def run_waves(configs, workers=None):
+    """
+    Parse several waves, html files are parsed in parallel when workers is not 1,
+    the tables are then built one wave after another
+    """
+    for config, df in zip(configs, parse_waves(configs, workers)):
+        build_tables(config, df)
+    debug_artifacts.flush()
+
+
+def build_tables(config, df):
+    """
+    Manual fixes and pipeline tables of one wave from its parsed html files
+    """
+    input_dir = config['input_dir']
+    wave_name = config['name']
+
+    output_dir = os.path.join(input_dir, config['output_dir'])
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    debug_artifacts.dump('parse', df, 'DF.csv', sep='\t')
+
+    df = manual_fix(df, config['manual_fix'])
+
+    df = df.drop_duplicates()
+    df = df.sort_values('new_sourceline').reset_index()
+
+    #TODO
+    # remove duplicated conditions.
+    # If there are two conditions with the same text e.g. Extrat5 and Extrat6 can the second one be ignored and the questask allions inside it be added to the first condition instead?
+    df = pd.concat([df.loc[df.source != 'Condition'],
+                    df.loc[(df.source == 'Condition') & (df.title.str.contains(r'ask all', case=False)) ],
+                    df.loc[(df.source == 'Condition') & (~ df.title.str.contains(r'ask all', na=False, case=False)) ].drop_duplicates(['title'],keep='first')]).sort_index()
+
+    # condition end at the next <ask all>
+    # 1. find all <ask all> locations
+    next_q = df.loc[(df['title'].str.contains(r'ask all', case=False)) | ( df['source'] == 'SequenceNumber' ), 'new_sourceline'].to_list()
+    # print(next_q)
+    # 2. each condition ends at the first one after it
+    df['condition_end'] = np.where(df['source'] == 'Condition', next_marker(df['new_sourceline'], next_q), np.nan)
+
+    #df.to_csv('tmp_sourceline.csv', sep='\t')
+
+    # remove {ask all}
+    # df = df[~(df['title'].str.contains(r'ask all', case=False))]
+    df = df[~(df['title'].str.lower().isin(['{ask all}', '{ask all)', '{ ask all )', '{ask all }', '{ask all)}', '{ask all)l}']))]
+
+    # rename duplicated question names
+    df['tmp'] = df.groupby('title').cumcount()
+    df['title_new'] = df.apply(lambda row: row['title'] + '_' + str(row['tmp']) if row['source'] == 'SectionNumber' else row['title'], axis=1)
+    if config['question_suffix'] == 'replace':
+        df['title_new'] = df['title_new'].str.replace('_0', '')
+    else:
+        df['title_new'] = df['title_new'].str.strip('_0')
+
+    # find each question
+    df['questions'] = df.apply(lambda row: row['title_new'] if row['source'] in ['SectionNumber'] else None, axis=1)
+    df['questions'] = df['questions'].ffill()
+
+    df.drop(['tmp', 'sourceline', 'title'], axis=1, inplace=True)
+    df.rename(columns={'new_sourceline': 'sourceline', 'title_new': 'title'}, inplace=True)
+
+    # actual questionnaire
+    df['seq'] = df['seq'].astype(int)
+    if config['attempt_csv']:
+        debug_artifacts.dump('parse', df.sort_values('sourceline'), os.path.join(input_dir, config['attempt_csv']), sep= ';', encoding = 'utf-8', index=False)
+
+
+    # 1. Codes
+    df_codes = df.loc[(df.source == 'codelist'), ['questions', 'sourceline', 'seq', 'title']]
+    # label
+    df_codes['Label'] = 'cs_q' + df_codes['questions']
+    df_codes.rename(columns={'sourceline': 'Number', 'seq': 'codes_order'}, inplace=True)
+    #df_codes['value'] = df_codes['codes_order']
+    code_value_markers = config['code_value_markers']
+    df_codes['value'] = df_codes.apply(lambda row: row['title'].split('. ')[0] if any(m in row['title'] for m in code_value_markers) else row['codes_order'], axis=1)
+
+    # strip number. out from title
+    df_codes['Category_old'] = df_codes['title'].apply(lambda x: re.sub('^-*\d+', '', x).strip('.').strip(',').strip(' '))
+
+    # ignore the GOTO…. in categories
+    df_codes['Category'] = df_codes['Category_old'].apply(lambda x: x[:x.index("GOTO")].rstrip() if 'GOTO' in x else x)
+
+    df_codes_out = df_codes.drop(['questions', 'title', 'Category_old'], 1)
+
+    # write out
+    df_codes_out.rename(columns={'codes_order': 'Code_Order',
+                                 'value': 'Code_Value'},
+                        inplace=True)
+    df_codes_out = df_codes_out[['Label', 'Code_Order', 'Code_Value', 'Category']]
+
+    if config['sort_codes']:
+        # sort by code order, before the dedupe so that keep='last' keeps the last code in order
+        df_codes_out = df_codes_out.sort_values(by=['Label', 'Code_Order'], ascending=True)
+
+    #remove duplicate per group;
+    df_codes_out = df_codes_out.drop_duplicates(subset=['Label', 'Category'], keep='last')
+
+    df_codes_out.to_csv(os.path.join(output_dir, 'codelist.csv'), encoding = 'utf-8', index=False, sep=';')
+
+    # 2. Response: numeric, text, datetime
+    df_response = df.loc[(df.source == 'Response') , ['questions', 'sourceline', 'seq', 'title']]
+    #df_response.to_csv(os.path.join(input_dir, 'df_response.csv'), encoding = 'utf-8', index=False, sep=';')
+
+    df_response['Type'] = df_response['title'].apply(lambda x: 'Numeric' if any (c in x for c in ['Numeric', 'RANGE'])
+                                                          else 'Date' if x in ['ENTER DATE', 'DATETYPE']
+                                                          else 'Text')
+    df_response['Numeric_Type/Datetime_type'] = df_response['title'].apply(lambda x: 'Integer' if any (c in x for c in ['Numeric', 'RANGE'])
+                                                                                else 'DateTime' if x in ['ENTER DATE', 'DATETYPE']
+                                                                                else '')
+    df_response['Min'] = df_response['title'].apply(lambda x: re.findall(r'\d+', x)[0] if len(re.findall(r'\d+', x)) == 2 else None)
+    df_response['Max'] = df_response['title'].apply(lambda x: re.findall(r'\d+', x)[-1] if len(re.findall(r'\d+', x)) >= 1 else None)
+
+    # request 2: Change all numeric response domains to the format 'Range: 1-18'
+    # open answers without a max be entered as Long text
+    # open answers with a max be entered as Generic text
+    def find_between( s, first, last ):
+        try:
+            start = s.index( first ) + len( first )
+            end = s.index( last, start )
+            return s[start:end]
+        except ValueError:
+            return ""
+    df_response['title1'] = df_response.apply(lambda row: row['title'].replace(find_between(row['title'], row['Min'], row['Max']), '-').replace('Numeric', 'Range').replace('Hours', 'Range:') if not pd.isnull(row['Min']) > 0 else 'Long text' if (len(re.findall('(?i)open', row['title'])) > 0 and pd.isnull(row['Max'])) else 'Generic text' if (len(re.findall('(?i)open', row['title'])) > 0 and not pd.isnull(row['Max'])) else 'Generic date' if row['title'] == 'DATETYPE' else row['title'], axis=1)
+
+    # df_response.to_csv('temp_response.csv', sep=';')
+    # need to change these in the original df
+    vdic = pd.Series(df_response.title1.values, index=df_response.title).to_dict()
+    df.loc[df.title.isin(vdic.keys()), 'title'] = df.loc[df.title.isin(vdic.keys()), 'title'].map(vdic)
+
+    df_response = df_response.drop('title', 1)
+
+
+    df_response.rename(columns={'title1': 'Label'}, inplace=True)
+
+    # de-dup
+    response_keep = ['Label', 'Type', 'Numeric_Type/Datetime_type', 'Min', 'Max']
+    df_response_sub = df_response.loc[:, response_keep]
+    df_response_dedup1 = df_response_sub.drop_duplicates()
+
+    df_response_dedup = df_response_dedup1.drop_duplicates(subset='Label', keep='first')
+
+    df_response_dedup.rename(columns={'Numeric_Type/Datetime_type': 'Type2'},
+                             inplace=True)
+    df_response_dedup['Max'] = df_response_dedup.apply(lambda row: 255 if row['Label'] == 'Generic text' else row['Max'], axis=1)
+    df_response_dedup['Format'] = None
+    response_pipeline = ['Label', 'Type', 'Type2', 'Format', 'Min', 'Max']
+
+    df_response_dedup[response_pipeline].to_csv(os.path.join(output_dir, 'response.csv'), sep= ';', encoding = 'utf-8', index=False)
+
+
+    # 3. Statements
+    df_statement = get_statements(df[df['source'] == 'Statement'])
+
+    # 4. question items
+    summary = question_summary(df)
+    df_question_items = get_question_items(df, summary)
+
+    # 5. Sequences
+    df_sequences = df[df['source'].isin(['Section', 'SequenceNumber'])]
+#    df_sequences = df.loc[(df.source == 'SequenceNumber'), :].reset_index()
+    df_sequences.rename(columns={'title': 'Label'}, inplace=True)
+    df_sequences['section_id_1'] = df_sequences.groupby('section_name').cumcount()
+    df_sequences['section_id_2'] = df_sequences.groupby('source').cumcount()+1
+    df_sequences['section_id'] = df_sequences.apply(lambda row: row['section_id_1'] if row['source'] == 'SequenceNumber' else row['section_id_2'] if row['source'] == 'Section' else None, axis=1)
+    df_sequences = df_sequences.drop(columns=['section_id_1', 'section_id_2'])
+    df_sequences['Parent_Name'] = df_sequences.apply(lambda row: row['section_name'] if row['source'] == 'SequenceNumber' else wave_name if row['source'] == 'Section' else None, axis=1)
+#    df_sequences['section_id'] = df_sequences.index + 1
+
+    df_sequence_input = df_sequences.loc[:, ['sourceline', 'Label', 'section_id', 'Parent_Name']]
+
+    # pipeline columns
+    sequence_pipeline = ['Label', 'Parent_Type', 'Parent_Name', 'Branch', 'Position']
+    df_sequence_input.rename(columns={'section_id': 'Position'}, inplace=True)
+    df_sequence_input['Parent_Type'] = 'CcSequence'
+
+  #  df_sequence_input['Parent_Name'] = wave_name
+    df_sequence_input['Branch'] = None
+
+    df_seq_output = df_sequence_input[sequence_pipeline]
+
+    # manual fix: TODO
+    for parent_name, offset in config['sequence_position_offset'].items():
+        df_seq_output['Position'] = df_seq_output.apply(lambda row: row['Position'] + offset if row['Parent_Name'] == parent_name else row['Position'], axis=1)
+
+    # add top level
+    df_seq_output.loc[-1] = [wave_name, 'CcSequence', None, None, 1]  # adding a row
+
+    df_seq_output.index = df_seq_output.index + 1  # shifting index
+
+    df_seq_output.sort_index(inplace=True)
+    debug_artifacts.dump('sequences', df_seq_output, 'tmp_s.csv')
+    df_seq_output.to_csv(os.path.join(output_dir, 'sequence.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+
+    # 6. Conditions
+    df_conditions = get_conditions(df)
+    #df_conditions.to_csv(os.path.join(input_dir, 'df_conditions.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+
+    # 7. Loops
+    df_loops = get_loops(df, config['loops'])
+    #df_loops.to_csv(os.path.join(input_dir, 'df_loops.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+
+    # 8. Find parent label
+    df_sequences_p = df_sequences.loc[:, ['sourceline', 'Label']]
+    df_sequences_p['source'] = 'CcSequence'
+    df_questions_items_p = df_question_items.loc[:, ['sourceline', 'Label']].drop_duplicates()
+
+    df_questions_items_p['source'] = 'CcQuestions'
+    """
+    df_questions_grids_p = df_question_grids.loc[:, ['sourceline', 'Label']]
+    df_questions_grids_p['source'] = 'CcQuestions'
+    """
+    df_conditions_p = df_conditions.loc[:, ['sourceline', 'Label', 'condition_end']]
+    df_conditions_p.rename(columns={'condition_end': 'End Value'}, inplace=True)
+    df_conditions_p['source'] = 'CcCondition'
+
+    df_loops_p = df_loops.loc[:, ['Start Value', 'End Value', 'Label']]
+    df_loops_p.rename(columns={'Start Value': 'sourceline'}, inplace=True)
+    df_loops_p['source'] = 'CcLoop'
+    df_statement_p = df_statement.loc[:, ['sourceline', 'Label']]
+    df_statement_p['source'] = 'CcStatement'
+
+    df_sequences_p_1 = pd.DataFrame([[0, 'LSYPE_Wave_1', 'CcSequence']], columns=['sourceline', 'Label', 'source'])
+    """
+    df_parent = pd.concat([df_sequences_p, df_questions_items_p, df_questions_grids_p, df_conditions_p, df_sequences_p_1, df_loops_p, df_statement_p]).reset_index()
+    """
+    df_parent = pd.concat([df_sequences_p, df_questions_items_p, df_conditions_p, df_sequences_p_1, df_loops_p, df_statement_p]).reset_index()
+
+    df_parent = df_parent.sort_values(by=['sourceline']).reset_index()
+    #df_parent.to_csv('TMP_parent.csv', sep='\t')
+
+    df_sequence_position = df_parent
+    df_sequence_position['Position'] = range(0, len(df_sequence_position))
+    debug_artifacts.dump('sequences', df_sequence_position, os.path.join(input_dir, 'df_sequence_position.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+    df_sequences_out = df_sequence_position.loc[(df_sequence_position['source'] == 'CcSequence') & (df_sequence_position['Label'] != 'LSYPE_Wave_1'), :]
+    df_sequences_out.rename(columns={'Position': 'section_id'}, inplace=True)
+    debug_artifacts.dump('sequences', df_sequences_out.loc[:, ['sourceline', 'Label', 'section_id']], os.path.join(input_dir, 'sequences_1.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+    #TODO
+    # End at the next {ask all}
+    df_parent['End'] = df_parent.apply(lambda row: row['End Value']  if row['source'] == 'CcCondition' else row['End Value'], axis=1)
+
+    # sections region
+    df_sequences_m = df_sequence_position.loc[(df_sequence_position['source'] == 'CcSequence'), ['Label', 'sourceline']]
+    df_sequences_m.rename(columns={'Label': 'section_label'}, inplace=True)
+    debug_artifacts.dump('sequences', df_sequences_m, os.path.join(input_dir, 'df_sequences_m.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+
+    df_all_new = pd.merge(df_parent, df_sequences_m, how='left', on=['sourceline'])
+    #df_all_new['section_id'] = df_all_new['section_id'].fillna(method='ffill')
+    df_all_new['section_label'] = df_all_new['section_label'].fillna(method='ffill')
+    # df_all_new.to_csv(os.path.join(input_dir, 'TMP.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+    # Label statements after the next question e.g, statement_1 label would be s_qSHGInt
+    # find next question for all statements
+    d_statement_replace = statement_names(df_all_new['Label'])
+    # print(d_statement_replace)
+
+    df_mapping = df_parent.loc[ df_parent['End'] > 0, ['Label', 'source', 'sourceline', 'End']]
+
+    #df_mapping.to_csv(os.path.join(input_dir, 'TMP_mapping.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+    # find above label, only questions and conditions are nested below other constructs
+    above_label, parent_type, position = assign_parents(df_all_new['sourceline'], df_all_new['End'], df_all_new['section_label'],
+                                                        ~df_all_new['source'].isin(['CcQuestions', 'CcCondition']),
+                                                        df_mapping['sourceline'], df_mapping['End'], df_mapping['Label'])
+    df_all_new['above_label'] = above_label
+
+    # df_all_new.to_csv(os.path.join(input_dir, 'TMPTMP.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+    # calculate position
+    df_all_new['Position'] = position
+
+    df_all_new['parent_type'] = parent_type
+
+    df_all_new['branch'] = 0
+    df_all_new['Position'] = df_all_new['Position'].astype(int)
+
+    # replace new name for statement
+    df_all_new = df_all_new.replace(d_statement_replace)
+
+    debug_artifacts.dump('parents', df_all_new, os.path.join(input_dir, 'df_parent.csv'), sep = ';', encoding = 'utf-8', index=False)
+
+    # output csv
+    df_questions_new = pd.merge(df_question_items, df_all_new, how='left', on=['sourceline', 'Label'])
+
+    questions_keep = ['Label', 'Literal', 'Instructions', 'Response', 'above_label', 'parent_type', 'branch', 'Position', 'rd_order', 'Interviewee']
+    df_qi_input = df_questions_new[questions_keep]
+
+    # pipeline columns
+    question_item_pipeline = ['Label', 'Literal', 'Instructions', 'Response', 'Parent_Type', 'Parent_Name', 'Branch', 'Position', 'min_responses', 'max_responses', 'rd_order', 'Interviewee']
+    df_qi_input.rename(columns={'above_label': 'Parent_Name',
+                                'parent_type': 'Parent_Type',
+                                'branch': 'Branch'}, inplace=True)
+    df_qi_input['min_responses'] = 1
+    df_qi_input['max_responses'] = 1
+
+    df_qi_input[question_item_pipeline].to_csv(os.path.join(output_dir, 'question_item.csv'), encoding='utf-8', index=False, sep = ';')
+    """
+    df_question_grids_new = pd.merge(df_question_grids, df_all_new, how='left', on=['sourceline', 'Label'])
+    question_grids_keep = ['Label', 'Literal', 'Instructions', 'horizontal_code_list_name', 'vertical_code_list_name', 'above_label', 'parent_type', 'branch', 'Position']
+    df_question_grids_new[question_grids_keep].to_csv(os.path.join(output_dir, 'question_grids.csv'), sep = ';', encoding='utf-8', index=False)
+    """
+    df_conditions_new = pd.merge(df_conditions, df_all_new, how='left', on=['sourceline', 'Label'])
+
+    conditions_keep = ['Label', 'Literal', 'Logic', 'above_label', 'parent_type', 'branch', 'Position']
+    df_condition_input = df_conditions_new[conditions_keep]
+
+    # pipeline columns
+    condition_pipeline = ['Label', 'Literal', 'Logic', 'Parent_Type', 'Parent_Name', 'Branch', 'Position']
+    df_condition_input.rename(columns={'above_label': 'Parent_Name',
+                                'parent_type': 'Parent_Type',
+                                'branch': 'Branch'}, inplace=True)  
+
+    df_condition_input[condition_pipeline].to_csv(os.path.join(output_dir, 'condition.csv'), sep = ';', encoding='utf-8', index=False)
+
+    df_loops_new = pd.merge(df_loops, df_all_new[['Label', 'sourceline', 'Position', 'above_label', 'parent_type', 'branch']], how='left', on=['Label'])
+    loops_keep = ['Label', 'Variable', 'Start Value', 'End Value', 'Loop While', 'Logic', 'above_label', 'parent_type', 'branch', 'Position']
+
+    df_loops_new['Start Value'] = 1
+    df_loops_new['End Value'] = ''
+    df_loops_new['Loop While'] = ''
+
+    df_loop_input = df_loops_new[loops_keep]
+
+    # pipeline columns
+    loop_pipeline = ['Label', 'Loop_While', 'Start_value', 'End_Value', 'Variable', 'Parent_Type', 'Parent_Name', 'Branch', 'Position']
+    df_loop_input.rename(columns={'Start Value': 'Start_value',
+                                'End Value': 'End_Value',
+                                'Logic': 'Loop_While',
+                                'above_label': 'Parent_Name',
+                                'parent_type': 'Parent_Type',
+                                'branch': 'Branch'}, inplace=True)
+
+    df_loop_input[loop_pipeline].to_csv(os.path.join(output_dir, 'loop.csv'), encoding='utf-8', sep=';', index=False)
+
+    # replace new name for statement
+    df_statement = df_statement.replace(d_statement_replace)
+
+    df_statement_new = pd.merge(df_statement, df_all_new[['Label', 'sourceline', 'Position', 'above_label', 'parent_type', 'branch']], how='left', on=['Label'])
+    statement_keep = ['Label', 'Literal', 'above_label', 'parent_type', 'branch', 'Position']
+
+    df_statement_input = df_statement_new[statement_keep]
+
+    # pipeline columns
+    statement_pipeline = ['Label', 'Literal', 'Parent_Type', 'Parent_Name', 'Branch', 'Position']
+    df_statement_input.rename(columns={'above_label': 'Parent_Name',
+                                'parent_type': 'Parent_Type',
+                                'branch': 'Branch'}, inplace=True)
+
+    df_statement_input[statement_pipeline].to_csv(os.path.join(output_dir, 'statement.csv'), encoding='utf-8', sep=';', index=False)
@@ -0,0 +1,403 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Per file questionnaire frames (df_q) of the LSYPE html parsers:
+    read the html elements, classify them with the rule tables, one df_q per html file.
+    Only this module, normalize_text.py and the df_q settings of a wave go into the
+    lsype_cache key, so editing the table rules in lsype_html.py keeps the cached frames.
+"""
+
+from collections import deque
+from lxml import etree
+import pandas as pd
+import numpy as np
+import re
+
+from normalize_text import to_ascii, answer_label, squash, normalize_all
+
+
+def element_filter(class_names, section_tag='h2'):
+    """
+    want(tag, class): True for the elements get_elements collects
+    """
+    tags = ('h1', section_tag)
+
+    def want(tag, elem_class):
+        if tag in tags:
+            return True
+        return elem_class is not None and any(name in elem_class for name in class_names)
+    return want
+
+
+def tree_records(tree, want):
+    """
+    (order, sourceline, tag, class, text) for the wanted elements of a parsed tree, in document order
+    """
+    # comments and processing instructions are skipped and not counted
+    for order, elem in enumerate(tree.iter(tag=etree.Element)):
+        elem_class = elem.get('class')
+        if want(elem.tag, elem_class):
+            yield order, elem.sourceline, elem.tag, elem_class, "".join(elem.itertext())
+
+
+def iter_records(htmlFile, want, encoding=None):
+    """
+    Streaming version of tree_records(html_to_tree(htmlFile), want):
+    same records in the same order, from iterparse instead of a full tree.
+    A wanted element is emitted once it is closed and everything before it has been emitted,
+    elements are cleared as soon as no open wanted element needs their text,
+    so memory stays at about one top level element instead of the whole file
+    """
+    pending = deque()  # wanted elements in document order: [order, elem, record]
+    opened = []  # wanted elements not closed yet, innermost last
+    order = 0
+    for event, elem in etree.iterparse(htmlFile, events=('start', 'end'), html=True, encoding=encoding):
+        if event == 'start':
+            elem_class = elem.get('class')
+            if want(elem.tag, elem_class):
+                entry = [order, elem, None]
+                pending.append(entry)
+                opened.append(entry)
+            order += 1
+            continue
+
+        if opened and opened[-1][1] is elem:
+            entry = opened.pop()
+            entry[1] = None
+            entry[2] = (entry[0], elem.sourceline, elem.tag, elem.get('class'), "".join(elem.itertext()))
+            while pending and pending[0][2] is not None:
+                yield pending.popleft()[2]
+
+        if not opened:
+            # nothing still open needs this text, free it and the siblings before it
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+
+def read_records(htmlFile, config, streaming=False):
+    """
+    element records of one html file, from iterparse when streaming else from a full tree
+    """
+    elements = config['elements']
+    want = element_filter(elements['class_names'], elements.get('section_tag', 'h2'))
+    if streaming:
+        return iter_records(htmlFile, want, config.get('html_encoding'))
+    return tree_records(html_to_tree(htmlFile, config.get('html_encoding')), want)
+
+
+def get_elements(records, class_names, section_tag='h2', class_sources=None, split_classes=('listlevel1WW8Num',), strip_copyright=False):
+    """
+    One walk over the element records (tree_records/iter_records),
+    replaces get_SequenceNumber + get_SectionNumber + one get_class per class name
+        - 'h1' elements are SequenceNumber
+        - section_tag elements are SectionNumber
+        - each name in class_names is a bucket matching elements with that class substring,
+          source follows the get_class 'Standard'/'SectionNumber' hack unless given in class_sources
+        - text of split_classes elements is split into one row per line with seq = 1, 2, ...
+    Rows come out in the same order and with the same index as the old concat + sort
+    """
+    class_sources = class_sources or {}
+    # get_class hack state, one per bucket
+    states = list(class_names)
+    tag_buckets = [(0, 'h1', 'SequenceNumber'), (1, section_tag, 'SectionNumber')]
+    n_tag = len(tag_buckets)
+    bucket_size = [0] * (n_tag + len(class_names))
+    split_seq = {}
+
+    keys = []
+    index = []
+    source = []
+    sourceline = []
+    title = []
+    seq = []
+
+    for order, line, tag, elem_class, text in records:
+        hits = [(b, src) for b, t, src in tag_buckets if tag == t]
+        if elem_class is not None:
+            hits.extend((n_tag + i, name) for i, name in enumerate(class_names) if name in elem_class)
+        if not hits:
+            continue
+
+        raw = text.strip()
+        s = None
+        for b, name in hits:
+            if b >= n_tag:
+                i = b - n_tag
+                # hack to rescure some
+                if ' ©' in raw and states[i] == 'Standard':
+                    states[i] = 'SectionNumber'
+                else:
+                    states[i] = 'Standard'
+                src = class_sources.get(name, states[i])
+            else:
+                src = name
+            if s is None:
+                s = to_ascii(raw, strip_copyright)
+            if not s:
+                continue
+
+            if b >= n_tag and name in split_classes:
+                # split string into multiple rows, numbered per (source, sourceline) as groupby cumcount did
+                for part in s.split('\n'):
+                    n = split_seq.get((states[b - n_tag], line), 0) + 1
+                    split_seq[(states[b - n_tag], line)] = n
+                    keys.append((line, 0, n, b, order))
+                    index.append(bucket_size[b])
+                    source.append(name)
+                    sourceline.append(line)
+                    title.append(part)
+                    seq.append(n)
+            else:
+                keys.append((line, 1, 0, b, order))
+                index.append(bucket_size[b])
+                source.append(src)
+                sourceline.append(line)
+                title.append(s)
+                seq.append(0)
+            bucket_size[b] += 1
+
+    # sourceline order, split rows first within a line, then bucket order, then document order
+    ordered = sorted(range(len(keys)), key=keys.__getitem__)
+    return pd.DataFrame({'source': [source[i] for i in ordered],
+                         'sourceline': [sourceline[i] for i in ordered],
+                         'title': [title[i] for i in ordered],
+                         'seq': [seq[i] for i in ordered]},
+                        index=[index[i] for i in ordered])
+
+
+# Rule tables for get_questionnaire: (source, tests) pairs, first rule whose tests all pass wins,
+# rows matching no rule keep their current source.
+# tests: 'source'/'not_source' (list of sources), 'title'/'not_title' (list of exact titles),
+#        'match'/'not_match' (compiled pattern searched in title), 'isupper' (title.isupper()),
+#        'first_word_upper' (first word of title is all upper case)
+SOURCE_RULES = [
+    ('codelist', {'source': ['Standard', 'PlainText'], 'match': re.compile(r'^(?:\d|-1|-92|No\Z)')}),
+    ('codelist', {'source': ['listlevel1WW8Num']}),
+    ('Instruction', {'match': re.compile(r'^(?:show|press|enter|- |multicoded)', re.IGNORECASE)}),
+    # All text which starts with upper case words should be added to instructions
+    ('Instruction', {'source': ['Standard', 'PlainText'], 'match': re.compile(r' '), 'first_word_upper': True,
+                     'not_match': re.compile(r'^(?:\{|\(|\*|\.\.\.|I )')}),
+    # Open answer should be a response domain Generic text rather than used/added to question literal.
+    # Open type: long verbatim answer is the response domain Long text
+    # Hours 0-XX is a response domain which should be labelled Range: 0-50
+    ('Response', {'match': re.compile(r'^(?:open|hours)', re.IGNORECASE)}),
+    ('Standard', {'match': re.compile(r'ask all')}),
+]
+
+CONDITION_RULES = [
+    ('Loop', {'match': re.compile(r'loop repeats|loop ends|end loop|start loop|END OF AVCE LOOP|{Record for each|{Ask for each|{For each|{Ask for all', re.IGNORECASE)}),
+    ('Condition', {'match': re.compile(r'Ask if|{|{If|{\(If|{ If|If claiming sickness|\(If Repred|\(If Ben1|\(IF HEPOSS9 = 1-3\)|If wrk1a', re.IGNORECASE)}),
+]
+
+INSTRUCTION_RULES = [
+    ('Instruction', {'isupper': True,
+                     'not_title': ['NOT USING INTERPRETER, MAIN PARENT ANSWERING QUESTIONS', 'USING INTERPRETER'],
+                     'not_source': ['SequenceNumber', 'SectionNumber', 'Loop'],
+                     'not_match': re.compile(r'DATETYPE')}),
+    ('Instruction', {'match': re.compile(r'INTERVIEWER|Interviewer|look at this card|NOTE|\[STATEMENT\]'),
+                     'not_source': ['SequenceNumber', 'SectionNumber', 'Loop'],
+                     'not_match': re.compile(r'DATETYPE')}),
+]
+
+RESPONSE_RULES = [
+    ('Response', {'match': re.compile(r'Numeric|Open answer|Open type|OPEN ENDED|ENTER DATE|DATETYPE', re.IGNORECASE),
+                  'not_source': ['Instruction', 'Loop']}),
+]
+
+# request 1: Change all text response domains to 'Generic text'
+TYPE_TEXT_RULES = [
+    (2, {'source': ['Response'], 'title': ['ENTER DATE']}),
+]
+
+
+def question_rules(question_list):
+    """
+    per wave rule: titles in question_list are question names
+    """
+    return [('SectionNumber', {'title': question_list})]
+
+
+def rule_mask(title, source, tests):
+    """
+    boolean array, True where title/source pass all tests of one rule
+    """
+    mask = np.ones(len(title), dtype=bool)
+    for key, value in tests.items():
+        if key == 'source':
+            mask &= source.isin(value).values
+        elif key == 'not_source':
+            mask &= ~source.isin(value).values
+        elif key == 'title':
+            mask &= title.isin(value).values
+        elif key == 'not_title':
+            mask &= ~title.isin(value).values
+        elif key == 'match':
+            mask &= title.str.contains(value, na=False).values
+        elif key == 'not_match':
+            mask &= ~title.str.contains(value, na=False).values
+        elif key == 'isupper':
+            mask &= (title.str.isupper() == value).values
+        elif key == 'first_word_upper':
+            first_word = title.str.partition(' ')[0]
+            mask &= ((first_word.str.upper() == first_word) == value).values
+        else:
+            raise ValueError('unknown rule test: {}'.format(key))
+    return mask
+
+
+def apply_rules(df, rules, default=None):
+    """
+    evaluate an ordered rule table column-wise on df['title'] and df['source'],
+    default to the current source
+    """
+    title = df['title']
+    source = df['source']
+    if default is None:
+        default = source.values
+    if not rules:
+        return pd.Series(default, index=df.index)
+    conditions = [rule_mask(title, source, tests) for _, tests in rules]
+    choices = [np.full(len(df), value) for value, _ in rules]
+    return pd.Series(np.select(conditions, choices, default=default), index=df.index)
+
+
+def apply_stages(df, stages):
+    """
+    apply rule tables one after another, each one reads the source from the previous one
+    """
+    df = df[['title', 'source']]
+    for rules in stages:
+        df = df.assign(source=apply_rules(df, rules))
+    return df['source']
+
+
+def html_to_tree(htmlFile, encoding=None):
+    """
+        Input: html file
+        Output: dictionary
+		# questions are in r['html']['body']['div'][1]['div'][2]['div']['html']['body'].keys()
+    """
+    parser = etree.HTMLParser(encoding=encoding)
+    with open(htmlFile, "rt") as f:
+        tree = etree.parse(f, parser)
+    return tree
+
+
+def get_questionnaire(records, config):
+    """
+    combine individual parts, return questionnaire dataframe
+    'Heading1Char' has duplicated sequence information
+    config['elements'] gives the classes to collect, config['question_list'] the extra question names
+    """
+    # one pass over the tree, rows already in sourceline order
+    df = get_elements(records, **config['elements'])
+
+    df = df.apply(lambda x: x.replace('U+00A9',''))
+
+    # -1 for don't know and -92 for refused
+    df['title_m'] = normalize_all(df['title'], answer_label)
+
+    df.drop('title', axis=1, inplace=True)
+    df.rename(columns={'title_m': 'title'}, inplace=True)
+
+    df['source_new'] = apply_rules(df, SOURCE_RULES)
+
+    # assign code list group
+    df['code_group'] = df['source_new'].ne(df['source_new'].shift()).cumsum()
+    df['sequence'] = df.groupby('code_group').cumcount() + 1
+
+    df['seq_new_code'] = df.apply(lambda row: re.search(r'-\d+', row['title']).group() if (row['source_new'] == 'codelist' and row['title'][0] == '-') 
+                                              else re.search(r'\d+', row['title']).group() if (row['source_new'] == 'codelist' and row['title'][0].isdigit() == True) else row['seq'], 
+                                              axis=1)
+
+    df['seq_new'] = df.apply(lambda row: row['seq_new_code'] if (row['source_new'] == 'codelist' and row['title'][0].isdigit() == True) else row['sequence'] if (row['source_new'] == 'codelist' and row['title'][0] == '-') else row['seq'], axis=1)
+
+    df['seq_new'] = df['seq_new'].astype(int)
+
+    df['seq_new_shift'] = df['seq_new'].shift(1).fillna(0).astype(int)
+    df['seq_new_shift_2'] = df['seq_new'].shift(2).fillna(0).astype(int)
+
+    df['seq_new_code_shift'] = df['seq_new_code'].shift(1).fillna(0).astype(int)
+
+    df['seq_new_code'] = df['seq_new_code'].astype(int)
+    #print(df.dtypes)
+
+    df['seq_attemp'] = df.apply(lambda row: row['seq_new_shift'] + 1 if (row['seq_new_shift'] > row['seq_new'] and row['seq_new_code'] < 0 and row['seq_new_code_shift'] > 0) 
+                                            else row['seq_new_shift_2'] + 2 if (row['seq_new_code'] < 0 and row['seq_new_code_shift'] < 0) 
+                                            else row['seq_new'], axis=1)
+
+    df.drop(['source', 'seq', 'code_group', 'sequence', 'seq_new_code', 'seq_new', 'seq_new_shift', 'seq_new_shift_2', 'seq_new_code_shift'], axis=1, inplace=True)
+    df['source'] = df['source_new'].replace('listlevel1WW8Num', 'codelist')
+    df['seq'] = df['seq_attemp']
+    df.drop(['source_new', 'seq_attemp'], axis=1, inplace=True)
+
+    df = df[pd.notnull(df['title'])]
+
+    df['title'] = normalize_all(df['title'], squash)
+    if config.get('drop_empty_titles'):
+        df = df[df['title'] != '']
+    df.drop_duplicates(keep = 'first', inplace = True)
+
+    # remove {ask all}, Refused, Dont know, Dont Know
+###    new_df_1 = df[~(df['title'].str.lower().isin(['{ask all}', '{ask all)', '{ ask all )', '{ask all }', '{ask all)}', '{ask all)l}']))]
+
+    # remove refused/dont know
+###    new_df = new_df_1.loc[(new_df_1['title'] != 'Refused') & (new_df_1['title'] != 'Dont know') & (new_df_1['title'] != 'Dont Know'), :]
+
+    new_df = df
+    # special case:
+    #new_df['condition_source'] = new_df.apply(lambda row: 'Condition' if any(re.findall(r'Ask if|{|{If|{\(If|{ If|If claiming sickness|\(If Repred|\(If Ben1|\(IF HEPOSS9 = 1-3\)|If wrk1a', row['title'], re.IGNORECASE)) 
+#else 'Loop' if any(re.findall(r'loop repeats|loop ends|end loop|start loop|END OF AVCE LOOP', row['title'], re.IGNORECASE))
+#else row['source'], axis=1)
+    question_list = config['question_list']
+    new_df['response_source'] = apply_stages(new_df, [CONDITION_RULES, INSTRUCTION_RULES, question_rules(question_list), RESPONSE_RULES])
+
+    new_df.drop(['source'], axis=1, inplace=True)
+
+    new_df.rename(columns={'response_source': 'source'}, inplace=True)
+
+    # request 1: Change all text response domains to 'Generic text'
+    new_df['Type_text'] = apply_rules(new_df, TYPE_TEXT_RULES, default=0)
+
+    for i in new_df.loc[(new_df['Type_text'] == 2), :]['sourceline'].tolist():
+        new_df.loc[new_df['sourceline'] == i, ['source']] = 'Standard'
+        new_df.loc[len(new_df)] = [i+0.5, 'DATETYPE', 0, 'Response', 0]
+
+    new_df_sorted = new_df.sort_values(['sourceline'])
+    new_df_sorted.drop(['Type_text'], axis=1, inplace=True)
+
+    return new_df_sorted
+
+
+def parse_html_file(htmlFile, config, idx):
+    """
+    Parse the idx-th html file of one wave, keep the actual questionnaire from line_start,
+    new_sourceline = sourceline + 100000*idx keeps the files apart
+    """
+    html_file = config['files'][idx]
+
+    section_name = html_file['section_name']
+    line_start = html_file['line_start']
+    interviewee = html_file['interviewee']
+
+    records = read_records(htmlFile, config, config.get('streaming', False))
+
+    df_q = get_questionnaire(records, config)
+
+    # add section line
+    # sourceline	section_name	seq	source
+    df_q.loc[len(df_q)] = [line_start, section_name, 0, 'Section']  # adding a row
+    df_q = df_q.sort_values('sourceline')
+
+    # actual questionnaire
+    df_q = df_q.loc[(df_q.sourceline >= line_start) , :]
+
+    df_q['new_sourceline'] = df_q['sourceline'] + 100000*idx
+    df_q['Interviewee'] = interviewee
+    df_q['section_name'] = section_name
+
+    return df_q
@@ -7,41 +7,12 @@
         - output dir = '../LSYPE1/wave8-xml/db_input_modified'
 """
 
-from collections import OrderedDict
 import pandas as pd
 import numpy as np
 import os
 import re
 
-
-def int_to_roman(num):
-
-    roman = OrderedDict()
-    roman[1000] = "m"
-    roman[900] = "cm"
-    roman[500] = "d"
-    roman[400] = "cd"
-    roman[100] = "c"
-    roman[90] = "xc"
-    roman[50] = "l"
-    roman[40] = "xl"
-    roman[10] = "x"
-    roman[9] = "ix"
-    roman[5] = "v"
-    roman[4] = "iv"
-    roman[1] = "i"
-
-    def roman_num(num):
-        for r in roman.keys():
-            x, y = divmod(num, r)
-            yield roman[r] * x
-            num -= (r * x)
-            if num <= 0:
-                break
-    if num == 0:
-        return "0"
-    else:
-        return "".join([a for a in roman_num(num)])
+from labeling import suffix_duplicates
 
 
 def modify_condition(old_file, new_file):
@@ -61,8 +32,7 @@ def modify_condition(old_file, new_file):
     df['Logic_name1'] = df['Logic_name'].apply(lambda x: '' if len(x) ==0 else x[0][0])
 
     # rename duplicates logic names
-    df['Logic_name_new'] = df.groupby('Logic_name1').Logic_name1.apply(lambda n: n.str.strip() + '_' + (np.arange(len(n))).astype(str))
-    df['Logic_name_roman'] = df['Logic_name_new'].apply(lambda x: '_'.join([x.rsplit('_', 1)[0], int_to_roman(int(x.rsplit('_', 1)[1]))]))
+    df['Logic_name_roman'] = suffix_duplicates(df['Logic_name1'].str.strip(), keys=df['Logic_name1'], start=0, keep_single=False)
     df['Logic_name_roman'] = df['Logic_name_roman'].str.strip('_0')
 
     df['Logic_new'] = df.apply(lambda row: row['Label'] if row['Logic_name_roman'] == '' else row['Logic_name_roman'], axis = 1)
@@ -0,0 +1,79 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Find the parent (above label) of every construct from start/end positions,
+    shared by lsype_html.py, pre_process_db_input.py and generations_scotland_covid19.py.
+
+    The parent of a row starting at s (and ending at t, or t = s when it has no end)
+    is the parent interval that starts closest before s and ends after t,
+    the first one in mapping order when several start at the same place;
+    rows without one take their section label.
+"""
+
+from bisect import bisect_left
+import numpy as np
+import pandas as pd
+
+
+def innermost_parents(starts, stops, parent_starts, parent_ends, parent_labels):
+    """
+    label of the innermost enclosing parent interval for each (start, stop), None when there is none.
+
+    One sweep over the rows in start order: parent intervals are pushed once their start is passed,
+    the stack only keeps intervals that end later than every interval pushed after them,
+    so the innermost parent ending after t is found by bisecting the stack ends, O(n log n) overall
+    instead of filtering the whole mapping for every row
+    """
+    starts = np.asarray(starts, dtype=float)
+    stops = np.asarray(stops, dtype=float)
+    stops = np.where(np.isnan(stops), starts, stops)
+    parent_starts = np.asarray(parent_starts, dtype=float)
+    parent_ends = np.asarray(parent_ends, dtype=float)
+    parent_labels = list(parent_labels)
+
+    # parent intervals by start, later mapping rows first among equal starts so the first one ends on top
+    valid = [i for i in range(len(parent_starts)) if not (np.isnan(parent_starts[i]) or np.isnan(parent_ends[i]))]
+    order = sorted(valid, key=lambda i: (parent_starts[i], -i))
+
+    result = [None] * len(starts)
+    stack_ends = []    # negated ends, ascending, for bisect
+    stack_labels = []
+    p = 0
+    for row in np.argsort(starts, kind='stable'):
+        s = starts[row]
+        if np.isnan(s):
+            continue
+        while p < len(order) and parent_starts[order[p]] < s:
+            i = order[p]
+            end = parent_ends[i]
+            # an interval ending no later than this one can never be the innermost match again
+            while stack_ends and -stack_ends[-1] <= end:
+                stack_ends.pop()
+                stack_labels.pop()
+            stack_ends.append(-end)
+            stack_labels.append(parent_labels[i])
+            p += 1
+        # ends decrease towards the top, the last one still ending after t is the innermost parent
+        k = bisect_left(stack_ends, -stops[row]) - 1
+        if k >= 0:
+            result[row] = stack_labels[k]
+    return result
+
+
+def parent_type(label):
+    return 'CcCondition' if label[0:1] == 'c' else 'CcLoop' if label[0:1] == 'l' else 'CcSequence'
+
+
+def assign_parents(starts, stops, section_labels, use_section, parent_starts, parent_ends, parent_labels):
+    """
+    above label, parent type and position (order within the parent) of each row,
+    rows where use_section is True always take their section label
+    """
+    found = innermost_parents(starts, stops, parent_starts, parent_ends, parent_labels)
+    above_label = [section if keep or label is None else label
+                   for label, section, keep in zip(found, section_labels, use_section)]
+
+    labels = pd.Series(above_label, dtype=object)
+    position = (labels.groupby(labels).cumcount() + 1).values
+    return np.array(above_label, dtype=object), [parent_type(label) for label in above_label], position
@@ -0,0 +1,91 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Memoized text normalization for the questionnaire parsers,
+    questionnaire text is very repetitive so every step is cached per distinct string
+        - to_ascii: unidecode, optionally drop ' (c)'
+        - answer_label: map don't know / refused / don't want to answer to the code list label
+        - squash: collapse white space and strip
+"""
+
+from functools import lru_cache
+from unidecode import unidecode
+import pandas as pd
+import re
+
+
+CACHE_SIZE = 65536
+
+# -1 for don't know and -92 for refused, 99 for don't want to answer;
+# one pass, the alternatives are tried in this order at the start of the text so don't know still wins over refused
+ANSWER_PATTERN = re.compile(r"(?:(?P<dont_know>(?=.*?(?:Don't know|don't know|Dont know|Dont Know|Don't Know|DONT KNOW|DON'T KNOW)))"
+                            r"|(?P<refused>(?=.*?(?:Refuse|refuse|REFUSE)))"
+                            r"|(?P<dont_want>(?=.*?(?:don't want to answer|Don't want to answer))))",
+                            re.DOTALL)
+
+ANSWER_LABELS = {'dont_know': "-1. Don't know",
+                 'refused': '-92. Refused',
+                 'dont_want': "99. Don't want to answer"}
+
+SPACE_PATTERN = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_ascii(text, strip_copyright=False):
+    """
+    unidecode, copyright sign becomes ' (c)' which some waves drop
+    """
+    text = unidecode(text)
+    if strip_copyright:
+        text = text.replace(' (c)', '')
+    return text
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def answer_label(text):
+    """
+    "-1. Don't know", '-92. Refused' or "99. Don't want to answer" when text mentions one, else text
+    """
+    m = ANSWER_PATTERN.match(text)
+    if m is None:
+        return text
+    return ANSWER_LABELS[m.lastgroup]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def squash(text):
+    """
+    collapse white space to one space and strip
+    """
+    return SPACE_PATTERN.sub(' ', text).strip()
+
+
+def normalize(text, strip_copyright=False):
+    """
+    all steps on one string
+    """
+    return squash(answer_label(to_ascii(text, strip_copyright)))
+
+
+def normalize_all(texts, func=normalize):
+    """
+    batch version: func is called once per distinct value, a Series comes back as a Series
+    """
+    if isinstance(texts, pd.Series):
+        mapping = {text: func(text) for text in pd.unique(texts)}
+        return texts.map(mapping)
+    return [func(text) for text in texts]
+
+
+def cache_report():
+    """
+    hit rate of each cache in this process
+    """
+    lines = []
+    for func in (to_ascii, answer_label, squash):
+        info = func.cache_info()
+        calls = info.hits + info.misses
+        rate = info.hits / calls if calls else 0.0
+        lines.append('{:<13} {:>9} calls {:>8} distinct  hit rate {:.1%}'.format(func.__name__, calls, info.currsize, rate))
+    return '\n'.join(lines)
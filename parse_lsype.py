@@ -0,0 +1,58 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Parse LSYPE html questionnaires with the shared engine in lsype_html.py
+        python parse_lsype.py --wave 1
+        python parse_lsype.py --wave 2 --wave 3
+        python parse_lsype.py --config my_wave.json
+        python parse_lsype.py --wave 1 --wave 2 --workers 0
+        python parse_lsype.py --wave 7 --streaming
+        python parse_lsype.py --wave 1 --no-cache
+        python parse_lsype.py --wave 1 --debug parents --debug sequences
+"""
+
+import argparse
+import json
+
+from lsype_html import load_config, run_waves
+import debug_artifacts
+from normalize_text import cache_report
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='parse-lsype', description='Parse LSYPE wave html questionnaires')
+    parser.add_argument('--wave', type=int, action='append', default=[], help='wave number, lsype_config/wave<N>.json')
+    parser.add_argument('--config', action='append', default=[], help='path to a wave config json file')
+    parser.add_argument('--workers', type=int, default=1, help='processes for parsing html files, 0 for one per cpu')
+    parser.add_argument('--streaming', action='store_true', help='read html with iterparse instead of building the whole tree')
+    parser.add_argument('--no-cache', action='store_true', help='parse every html file again instead of using the parsed file cache')
+    parser.add_argument('--debug', action='append', default=[], metavar='STAGE',
+                        help='write the debug csv files of a stage (parse, sequences, parents or all), also LSYPE_DEBUG=stage,...')
+    parser.add_argument('--cache-stats', action='store_true', help='print the text normalization cache hit rates (of this process, not of --workers)')
+    args = parser.parse_args()
+
+    if not args.wave and not args.config:
+        parser.error('one of --wave or --config is required')
+
+    configs = [load_config(wave) for wave in args.wave]
+    for path in args.config:
+        with open(path, 'rt') as f:
+            configs.append(json.load(f))
+
+    debug_artifacts.enable(args.debug)
+
+    for config in configs:
+        if args.streaming:
+            config['streaming'] = True
+        if args.no_cache:
+            config['cache'] = False
+
+    run_waves(configs, args.workers)
+
+    if args.cache_stats:
+        print(cache_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Parse several understanding society waves in one run, e.g.
+        python parse_understanding_society.py --wave 4 --wave 5 --workers 0
+        python parse_understanding_society.py ../understanding_society/wave6/main06.specification.v03.qsrx.xml
+    qsrx files are parsed in parallel, each wave's archivist tables are written next to its xml file,
+    the code lists and response domains of all waves are deduplicated in one shared pass
+"""
+
+import argparse
+import json
+import os
+import time
+
+from understanding_society import load_config, config_for_file, run_waves, timing_report
+import debug_artifacts
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='parse-understanding-society', description='Parse understanding society qsrx specifications')
+    parser.add_argument('xml', nargs='*', help='qsrx xml file, settings from the us_config wave with the same file name or the latest wave')
+    parser.add_argument('--wave', type=int, action='append', default=[], help='wave number, us_config/wave<N>.json')
+    parser.add_argument('--config', action='append', default=[], help='path to a wave config json file')
+    parser.add_argument('--workers', type=int, default=0, help='processes for parsing qsrx files, 0 for one per cpu')
+    parser.add_argument('--streaming', action='store_true', help='read the xml with iterparse instead of building the whole tree')
+    parser.add_argument('--shared-dir', help='where the shared code lists and response domains go, default archivist_tables in the common directory of the waves')
+    parser.add_argument('--no-shared', action='store_true', help='skip the shared dedupe across waves')
+    parser.add_argument('--debug', action='append', default=[], metavar='STAGE',
+                        help='write the debug csv files of a stage (loops or all), also LSYPE_DEBUG=stage,...')
+    args = parser.parse_args()
+
+    if not args.xml and not args.wave and not args.config:
+        parser.error('one of xml, --wave or --config is required')
+
+    configs = [load_config(wave) for wave in args.wave]
+    for path in args.config:
+        with open(path, 'rt') as f:
+            configs.append(json.load(f))
+    configs.extend(config_for_file(path) for path in args.xml)
+
+    debug_artifacts.enable(args.debug)
+
+    for config in configs:
+        if args.streaming:
+            config['streaming'] = True
+
+    shared_dir = None
+    if not args.no_shared:
+        shared_dir = args.shared_dir or os.path.join(os.path.commonpath([os.path.abspath(c['input_dir']) for c in configs]), 'archivist_tables')
+
+    start = time.perf_counter()
+    results = run_waves(configs, args.workers, shared_dir)
+    print(timing_report(results))
+    print('total: {:.2f}s'.format(time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
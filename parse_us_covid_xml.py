@@ -4,13 +4,29 @@
 """  
     Python 3
     Parse us covid19 xml file
+    The xml is read with lxml and every path is an XPath compiled once per store,
+    python parse_us_covid_xml.py --backend etree reads it with xml.etree.ElementTree instead
 """
 
+import argparse
+from collections import defaultdict
+import copy
+import functools
 import re
 import os
 import pandas as pd
 import xml.etree.ElementTree as ET
-from collections import OrderedDict
+
+try:
+    from lxml import etree
+    DEFAULT_BACKEND = 'lxml'
+except ImportError:
+    etree = None
+    DEFAULT_BACKEND = 'etree'
+
+from labeling import suffix_duplicates
+
+BACKENDS = ['lxml', 'etree']
 
 # xml namespace
 ns = {'r': 'ddi:reusable:3_3',
@@ -20,185 +36,278 @@ ns = {'r': 'ddi:reusable:3_3',
       'logicalproduct': 'ddi:logicalproduct:3_3'}
 
 
+def qname(tag):
+    """
+    'datacollection:Loop' -> '{ddi:datacollection:3_3}Loop'
+    """
+    prefix, name = tag.split(':')
+    return '{' + ns[prefix] + '}' + name
+
+
+def read_xml(xmlFile, backend=DEFAULT_BACKEND):
+    """
+    root element of xmlFile, parsed by lxml or xml.etree.ElementTree (backend 'lxml' or 'etree')
+    """
+    if backend == 'lxml':
+        if etree is None:
+            raise ImportError("lxml is not installed, use backend 'etree'")
+        return etree.parse(xmlFile, parser=etree.XMLParser(encoding="utf-8", huge_tree=True)).getroot()
+    return ET.parse(xmlFile, parser=ET.XMLParser(encoding="utf-8")).getroot()
+
+
+def path_compiler(backend):
+    """
+    path (e.g. 'r:Label/r:Content') -> function(element) returning the list of elements at path,
+    an etree.XPath with the DDI namespaces for lxml, findall for ElementTree; compiled once per path
+    """
+    if backend == 'lxml':
+        compile_path = lambda path: etree.XPath(path, namespaces=ns)
+    else:
+        compile_path = lambda path: lambda e: e.findall(path, ns)
+    return functools.lru_cache(maxsize=None)(compile_path)
+
+
+def fragment_store(root):
+    """
+    Index the DDI document once, the parse_* functions read from the store instead of searching root:
+        - fragments: tag -> elements directly inside a ddi:Fragment, like root.findall('./ddi:Fragment/tag')
+        - elements: tag -> elements at any depth in document order, like root.findall('.//tag'),
+          filled by elements() the first time a tag is asked for
+        - ids: r:ID -> element directly inside a ddi:Fragment
+        - results: memoized results of the parse_* functions
+        - path: compiled paths for find and findall, lxml or ElementTree as root
+    """
+    backend = 'lxml' if etree is not None and etree.iselement(root) else 'etree'
+    store = {'root': root, 'fragments': defaultdict(list), 'elements': dict(), 'ids': dict(), 'results': dict(),
+             'backend': backend, 'path': path_compiler(backend)}
+
+    fragment_tag = qname('ddi:Fragment')
+
+    for top in root:
+        if top.tag != fragment_tag:
+            continue
+        for e in top:
+            # lxml also yields comments and processing instructions, their tag is not a string
+            if isinstance(e.tag, str):
+                store['fragments'][e.tag].append(e)
+                ID = find(store, e, 'r:ID')
+                if ID is not None:
+                    store['ids'][ID.text] = e
+
+    return store
+
+
+def findall(store, e, path):
+    """
+    elements at path below e, path with the ns prefixes
+    """
+    return store['path'](path)(e)
+
+
+def find(store, e, path):
+    """
+    first element at path below e, None if there is none
+    """
+    found = store['path'](path)(e)
+    return found[0] if found else None
+
+
+def fragments(store, tag):
+    """
+    elements of type tag (e.g. 'datacollection:Sequence') directly inside a ddi:Fragment
+    """
+    return store['fragments'].get(qname(tag), [])
+
+
+def elements(store, tag):
+    """
+    elements of type tag at any depth, one search of the tree per tag
+    """
+    found = store['elements']
+    if tag not in found:
+        found[tag] = list(store['root'].iter(qname(tag)))
+    return found[tag]
+
+
+def element_by_id(store, ID):
+    """
+    fragment element with r:ID ID, None if there is none
+    """
+    return store['ids'].get(ID)
+
+
+def memoized(parse):
+    """
+    parse(store) runs once per store, every call returns a copy of that result
+    since callers add and rename columns of the frames they get
+    """
+    @functools.wraps(parse)
+    def wrapper(store):
+        results = store['results']
+        if parse.__name__ not in results:
+            results[parse.__name__] = parse(store)
+        return copy.deepcopy(results[parse.__name__])
+    return wrapper
+
+
 def pretty_print(xml):
-    from bs4 import BeautifulSoup
-    print(BeautifulSoup(ET.tostring(xml), "xml").prettify()) 
-
-
-def int_to_roman(num):
-    """
-        Convert integer to roman numeral.
-    """
-
-    roman = OrderedDict()
-    roman[1000] = "m"
-    roman[900] = "cm"
-    roman[500] = "d"
-    roman[400] = "cd"
-    roman[100] = "c"
-    roman[90] = "xc"
-    roman[50] = "l"
-    roman[40] = "xl"
-    roman[10] = "x"
-    roman[9] = "ix"
-    roman[5] = "v"
-    roman[4] = "iv"
-    roman[1] = "i"
-
-    def roman_num(num):
-        for r in roman.keys():
-            x, y = divmod(num, r)
-            yield roman[r] * x
-            num -= (r * x)
-            if num <= 0:
-                break
-    if num == 0:
-        return "0"
+    if etree is not None and etree.iselement(xml):
+        print(etree.tostring(xml, pretty_print=True, encoding='unicode'))
     else:
-        return "".join([a for a in roman_num(num)])
+        from bs4 import BeautifulSoup
+        print(BeautifulSoup(ET.tostring(xml), "xml").prettify()) 
 
 
-def parse_study(root):
+@memoized
+def parse_study(store):
     """
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: study 
     """
     columns = ['Agency', 'Title', 'Study_Name', 'Study_Label', 'Instrument']
-    df_study = pd.DataFrame(columns=columns)
+    study_rows = []
 
-    StudyUnit = root.find('./ddi:Fragment/studyunit:StudyUnit', ns)
-    Agency = StudyUnit.find('r:Agency', ns).text
-    ID = StudyUnit.find('r:ID', ns).text
-    Title = StudyUnit.find('r:Citation/r:Title/r:String', ns).text
-    ref_ID = StudyUnit.find('r:DataCollectionReference/r:ID', ns).text
+    StudyUnit = fragments(store, 'studyunit:StudyUnit')[0]
+    Agency = find(store, StudyUnit, 'r:Agency').text
+    ID = find(store, StudyUnit, 'r:ID').text
+    Title = find(store, StudyUnit, 'r:Citation/r:Title/r:String').text
+    ref_ID = find(store, StudyUnit, 'r:DataCollectionReference/r:ID').text
 
-    DataCollection = root.find('./ddi:Fragment/datacollection:DataCollection', ns)
-    data_ID = DataCollection.find('r:ID', ns).text
+    DataCollection = fragments(store, 'datacollection:DataCollection')[0]
+    data_ID = find(store, DataCollection, 'r:ID').text
 
     if ref_ID == data_ID:
-        ModuleName = DataCollection.find('datacollection:DataCollectionModuleName/r:String', ns).text
-        ModuleLabel = DataCollection.find('r:Label/r:Content', ns).text
+        ModuleName = find(store, DataCollection, 'datacollection:DataCollectionModuleName/r:String').text
+        ModuleLabel = find(store, DataCollection, 'r:Label/r:Content').text
 
-        Modules = DataCollection.find('r:UserAttributePair/r:AttributeValue', ns).text
+        Modules = find(store, DataCollection, 'r:UserAttributePair/r:AttributeValue').text
         for Module in Modules.replace('[', '').replace(']', '').replace('"', '').split(','):
             study_row = [Agency, Title, ModuleName, ModuleLabel, Module.replace('urn:ddi:uk.iser:', '')[:-2]]
-            df_study.loc[len(df_study)] = study_row
+            study_rows.append(study_row)
 
     else:
         print("Why more than one data collection?")
 
+    # every table collects its rows in a list and is built once, as object columns of text (also when there are no rows)
+    df_study = pd.DataFrame(study_rows, columns=columns, dtype=object)
     return df_study
 
 
-def parse_Instrument(root):
+@memoized
+def parse_Instrument(store):
     """
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: instrument element info
     """
     columns = ['Instrument_ID', 'Instrument_Label', 'ref', 'ref_ID']
-    df_instrument = pd.DataFrame(columns=columns)
+    instrument_rows = []
 
-    instruments = root.findall('./ddi:Fragment/datacollection:Instrument', ns)   
+    instruments = fragments(store, 'datacollection:Instrument')   
     for instrument in instruments:
-        ID = instrument.find('r:ID', ns).text
-        Label = instrument.find('r:Label/r:Content', ns).text
-        ref = instrument.find('datacollection:ControlConstructReference/r:TypeOfObject', ns).text
-        ref_ID = instrument.find('datacollection:ControlConstructReference/r:ID', ns).text
+        ID = find(store, instrument, 'r:ID').text
+        Label = find(store, instrument, 'r:Label/r:Content').text
+        ref = find(store, instrument, 'datacollection:ControlConstructReference/r:TypeOfObject').text
+        ref_ID = find(store, instrument, 'datacollection:ControlConstructReference/r:ID').text
    
-        df_instrument.loc[len(df_instrument)] = [ID, Label, ref, ref_ID]
+        instrument_rows.append((ID, Label, ref, ref_ID))
         
+    df_instrument = pd.DataFrame(instrument_rows, columns=columns, dtype=object)
     return df_instrument
         
 
-def parse_StatementItem(root):
+@memoized
+def parse_StatementItem(store):
     """ 
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: dataframe of statement
     """
 
     columns = ['Statement_ID', 'Statement_Name', 'Statement_Label', 'Literal']
-    df_StatementItem = pd.DataFrame(columns=columns)
+    statement_rows = []
 
-    StatementItems = root.findall('./ddi:Fragment/datacollection:StatementItem', ns)
+    StatementItems = fragments(store, 'datacollection:StatementItem')
     for StatementItem in StatementItems:
-        ID = StatementItem.find('r:ID', ns).text
-        Name = StatementItem.find('datacollection:ConstructName/r:String', ns).text
-        Label = StatementItem.find('r:Label/r:Content', ns).text
-        Literal = StatementItem.find('datacollection:DisplayText/datacollection:LiteralText/datacollection:Text', ns).text
+        ID = find(store, StatementItem, 'r:ID').text
+        Name = find(store, StatementItem, 'datacollection:ConstructName/r:String').text
+        Label = find(store, StatementItem, 'r:Label/r:Content').text
+        Literal = find(store, StatementItem, 'datacollection:DisplayText/datacollection:LiteralText/datacollection:Text').text
             
         statement_row = [ID, 's_q' + Name, Label, Literal.replace('\n', '')]
-        df_StatementItem.loc[len(df_StatementItem)] = statement_row
+        statement_rows.append(statement_row)
 
+    df_StatementItem = pd.DataFrame(statement_rows, columns=columns, dtype=object)
     return df_StatementItem
 
 
-def parse_category(root):
+@memoized
+def parse_category(store):
     """ 
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: dicrionary of category, 
             - key: ID
             - value: Label
     """
     category_dict = dict()
-    categories = root.findall('./ddi:Fragment/logicalproduct:Category', ns)
+    categories = fragments(store, 'logicalproduct:Category')
     for category in categories:
-        ID = category.find('r:ID', ns).text
-        Label = category.find('r:Label/r:Content', ns).text
+        ID = find(store, category, 'r:ID').text
+        Label = find(store, category, 'r:Label/r:Content').text
         category_dict[ID] = Label
 
     return category_dict
 
 
-def parse_codelist(root):
+@memoized
+def parse_codelist(store):
     """ 
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: dataframe of codelist
     """
 
-    category_dict = parse_category(root)
+    category_dict = parse_category(store)
 
     columns = ['ID', 'Name', 'Code_Value', 'Value', 'Category']
-    codelist_df = pd.DataFrame(columns=columns)
+    codelist_rows = []
 
-    codelists = root.findall('./ddi:Fragment/logicalproduct:CodeList', ns)
+    codelists = fragments(store, 'logicalproduct:CodeList')
     for codelist in codelists:
-        ID = codelist.find('r:ID', ns).text
-        CodeListName = codelist.find('logicalproduct:CodeListName/r:String', ns).text
-        Label = codelist.find('r:Label/r:Content', ns).text
+        ID = find(store, codelist, 'r:ID').text
+        CodeListName = find(store, codelist, 'logicalproduct:CodeListName/r:String').text
+        Label = find(store, codelist, 'r:Label/r:Content').text
 
-        codes = codelist.findall('logicalproduct:Code', ns)
+        codes = findall(store, codelist, 'logicalproduct:Code')
         for code in codes:
-            code_value = code.find('r:Value', ns).text
+            code_value = find(store, code, 'r:Value').text
             # remove those not in pdf
             if code_value[0] != '-':
-                category_ID = code.find('r:CategoryReference/r:ID', ns).text
+                category_ID = find(store, code, 'r:CategoryReference/r:ID').text
                 category_Label = category_dict[category_ID]
 
                 row = [ID, CodeListName, Label, code_value, category_Label]
-                codelist_df.loc[len(codelist_df)] = row
+                codelist_rows.append(row)
 
+    codelist_df = pd.DataFrame(codelist_rows, columns=columns, dtype=object)
     return codelist_df
 
 
-def parse_response(root):
+@memoized
+def parse_response_domains(store):
     """ 
-    input: root of ET xml
-    output: 
-        - dataframe of response of Text/Numeric/DateTime
-        - list of repeated labels
+    input: fragment store of the xml (fragment_store)
+    output: dataframe of the distinct responses of Text/Numeric/DateTime, repeated labels not numbered yet
     """
 
     columns = ['Label', 'Type', 'Type2', 'Format', 'Min', 'Max']
-    response_df = pd.DataFrame(columns=columns)
+    response_rows = []
 
     # Text Domain
-    TextDomains = root.findall('.//datacollection:TextDomain', ns) 
+    TextDomains = elements(store, 'datacollection:TextDomain') 
     for TextDomain in TextDomains:
         # label
-        if TextDomain.find('r:Label', ns) == None:
+        if find(store, TextDomain, 'r:Label') == None:
             Label = 'Generic text'
         else:
-            Label = TextDomain.find('r:Label/r:Content', ns).text
+            Label = find(store, TextDomain, 'r:Label/r:Content').text
 
         if 'minLength' in TextDomain.attrib.keys():
             minLength = TextDomain.attrib['minLength']
@@ -214,138 +323,181 @@ def parse_response(root):
             Label = 'Long text'
 
         text_row = [Label, 'Text', None, None, minLength, maxLength]
-        response_df.loc[len(response_df)] = text_row
+        response_rows.append(text_row)
 
     # Numeric Domain
-    NumericDomains = root.findall('.//datacollection:NumericDomain', ns) 
+    NumericDomains = elements(store, 'datacollection:NumericDomain') 
 
     for NumericDomain in NumericDomains:
         
-        if NumericDomain.find('r:Label', ns) == None:
+        if find(store, NumericDomain, 'r:Label') == None:
             Label = 'Generic number'
         else:
-            Label = NumericDomain.find('r:Label/r:Content', ns).text
+            Label = find(store, NumericDomain, 'r:Label/r:Content').text
 
-        if NumericDomain.find('r:NumericTypeCode', ns) == None:
+        if find(store, NumericDomain, 'r:NumericTypeCode') == None:
             NumericType = None
         else:
-            NumericType = NumericDomain.find('r:NumericTypeCode', ns).text
+            NumericType = find(store, NumericDomain, 'r:NumericTypeCode').text
 
-        if NumericDomain.find('r:NumberRange/r:Low', ns) == None:
+        if find(store, NumericDomain, 'r:NumberRange/r:Low') == None:
             low_value = None
         else:
-            low_value = NumericDomain.find('r:NumberRange/r:Low', ns).text
+            low_value = find(store, NumericDomain, 'r:NumberRange/r:Low').text
 
-        if NumericDomain.find('r:NumberRange/r:High', ns) == None:
+        if find(store, NumericDomain, 'r:NumberRange/r:High') == None:
             high_value = None
         else:
-            high_value = NumericDomain.find('r:NumberRange/r:High', ns).text
+            high_value = find(store, NumericDomain, 'r:NumberRange/r:High').text
 
         if Label == 'Generic number' and high_value == None:
             Label = 'Long number'
 
         numeric_row = [Label, 'Numeric', NumericType, None, low_value, high_value]
-        response_df.loc[len(response_df)] = numeric_row
+        response_rows.append(numeric_row)
 
     # DateTime Domain
-    DateTimeDomains = root.findall('.//datacollection:DateTimeDomain', ns) 
+    DateTimeDomains = elements(store, 'datacollection:DateTimeDomain') 
     for DateTimeDomain in DateTimeDomains:
 
         Label = 'Generic date'
         
-        if DateTimeDomain.find('r:Label', ns) == None:
+        if find(store, DateTimeDomain, 'r:Label') == None:
             Format = None
         else:
-            Format = DateTimeDomain.find('r:Label/r:Content', ns).text
+            Format = find(store, DateTimeDomain, 'r:Label/r:Content').text
 
-        if DateTimeDomain.find('r:DateTypeCode', ns) == None:
+        if find(store, DateTimeDomain, 'r:DateTypeCode') == None:
             DateType = None
         else:
-            DateType = DateTimeDomain.find('r:DateTypeCode', ns).text
+            DateType = find(store, DateTimeDomain, 'r:DateTypeCode').text
 
         date_row = [Label, 'Date', DateType, Format, None, None]
 
-        response_df.loc[len(response_df)] = date_row
+        response_rows.append(date_row)
+
+    response_df = pd.DataFrame(response_rows, columns=columns, dtype=object)
 
-    # find duplicated Label
     df = response_df.drop_duplicates(keep='first')
     df = df.reset_index(drop=True)
+
+    return df
+
+
+@memoized
+def parse_response(store):
+    """ 
+    input: fragment store of the xml (fragment_store)
+    output: 
+        - dataframe of response of Text/Numeric/DateTime
+        - list of repeated labels
+    """
+
+    # find duplicated Label
+    df = parse_response_domains(store)
     df['dup_number'] = df.groupby(['Label']).cumcount()
 
     df_sub = df.loc[(df.dup_number >0) , ['Label']]
     repeated_label = df_sub['Label'].unique().tolist()
 
-    df['Label'] = df.apply(lambda row: row['Label'] + ' ' + str(row['dup_number']) if row['dup_number'] > 0 else row['Label'], axis=1)
+    df['Label'] = suffix_duplicates(df['Label'], start=0, number=str, sep=' ', keep_single=False, keep_first=True)
     df.drop('dup_number', axis=1, inplace=True)
 
     return df, repeated_label
 
 
-def parse_QuestionConstruct(root):
+def response_key(Type, Label, Type2=None, Format=None, Min=None, Max=None):
+    """
+    key of a response domain, missing values are None
+    """
+    return tuple(None if pd.isnull(v) else v for v in (Type, Label, Type2, Format, Min, Max))
+
+
+def response_index(store):
+    """
+    response_key of each distinct response domain (with the label before numbering) -> Label in the response table
+    """
+    df_domains = parse_response_domains(store)
+    df_r, dup_label_list = parse_response(store)
+
+    index = dict()
+    for row, Label in zip(df_domains.itertuples(index=False), df_r['Label']):
+        index.setdefault(response_key(row.Type, row.Label, row.Type2, row.Format, row.Min, row.Max), Label)
+    return index
+
+
+@memoized
+def parse_QuestionConstruct(store):
     """ 
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: QuestionConstruct df
     """
     qc_columns = ['QC_ID', 'QC_Name', 'QuestionReference_type', 'QuestionReference_id']
-    df_qc = pd.DataFrame(columns=qc_columns)
+    qc_rows = []
 
-    QuestionConstructs = root.findall('./ddi:Fragment/datacollection:QuestionConstruct', ns)
+    QuestionConstructs = fragments(store, 'datacollection:QuestionConstruct')
     for QuestionConstruct in QuestionConstructs:
-        ID = QuestionConstruct.find('r:ID', ns).text
-        Name = QuestionConstruct.find('datacollection:ConstructName/r:String', ns).text
-        QuestionReference_type = QuestionConstruct.find('r:QuestionReference/r:TypeOfObject', ns).text
-        QuestionReference_id = QuestionConstruct.find('r:QuestionReference/r:ID', ns).text
+        ID = find(store, QuestionConstruct, 'r:ID').text
+        Name = find(store, QuestionConstruct, 'datacollection:ConstructName/r:String').text
+        QuestionReference_type = find(store, QuestionConstruct, 'r:QuestionReference/r:TypeOfObject').text
+        QuestionReference_id = find(store, QuestionConstruct, 'r:QuestionReference/r:ID').text
 
-        df_qc.loc[len(df_qc)] = [ID, Name, QuestionReference_type, QuestionReference_id]
+        qc_rows.append((ID, Name, QuestionReference_type, QuestionReference_id))
 
+    df_qc = pd.DataFrame(qc_rows, columns=qc_columns, dtype=object)
     return df_qc
 
 
-def parse_QuestionItem(root):
+@memoized
+def parse_QuestionItem(store):
     """ 
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: dataframe of QuestionItem
     """
 
     #TODO: if question has no literal, is this a real question?
 
-    df_r, dup_label_list = parse_response(root)
-    codelist_df = parse_codelist(root)
+    # response label of each response domain, code list name of each code list ID
+    response_labels = response_index(store)
+    codelist_df = parse_codelist(store)
+    codelist_names = dict()
+    for CodeID, CodeListName in zip(codelist_df['ID'], codelist_df['Name']):
+        codelist_names.setdefault(CodeID, CodeListName)
 
     columns = ['QI_ID', 'Label', 'Literal', 'Instructions', 'Response', 'min_responses', 'max_responses']
-    qi_df = pd.DataFrame(columns=columns)
+    qi_rows = []
 
-    QuestionItems = root.findall('.//datacollection:QuestionItem', ns) 
+    QuestionItems = elements(store, 'datacollection:QuestionItem') 
     for QuestionItem in QuestionItems:
-        ID = QuestionItem.find('r:ID', ns).text
-        Name = QuestionItem.find('datacollection:QuestionItemName/r:String', ns).text
+        ID = find(store, QuestionItem, 'r:ID').text
+        Name = find(store, QuestionItem, 'datacollection:QuestionItemName/r:String').text
         
-        if QuestionItem.find('datacollection:QuestionText', ns) == None: 
+        if find(store, QuestionItem, 'datacollection:QuestionText') == None: 
             Literal = None
         else:
-            Literal = QuestionItem.find('datacollection:QuestionText/datacollection:LiteralText/datacollection:Text', ns).text.replace('\n', '').replace('*', '')
+            Literal = find(store, QuestionItem, 'datacollection:QuestionText/datacollection:LiteralText/datacollection:Text').text.replace('\n', '').replace('*', '')
 
         # TODO: 1st instruction only?
         Instructions = None
-        for k in QuestionItem.findall('r:UserAttributePair', ns):
-            if k.find('r:UserAttributeKey', ns) != None and k.find('r:UserAttributeKey', ns).text == 'extension:QuestionInstruction':
-                Instructions = k.find('r:UserAttributeValue', ns).text
+        for k in findall(store, QuestionItem, 'r:UserAttributePair'):
+            if find(store, k, 'r:UserAttributeKey') != None and find(store, k, 'r:UserAttributeKey').text == 'extension:QuestionInstruction':
+                Instructions = find(store, k, 'r:UserAttributeValue').text
 
-        ResponseCardinality = QuestionItem.find('r:ResponseCardinality', ns)
+        ResponseCardinality = find(store, QuestionItem, 'r:ResponseCardinality')
         minimumResponses = ResponseCardinality.attrib['minimumResponses']
         maximumResponses = ResponseCardinality.attrib['maximumResponses']
 
         # response
-        TextDomain = QuestionItem.find('.//datacollection:TextDomain', ns) 
-        NumericDomain = QuestionItem.find('.//datacollection:NumericDomain', ns) 
-        DateTimeDomain = QuestionItem.find('.//datacollection:DateTimeDomain', ns) 
-        CodeDomain = QuestionItem.find('.//datacollection:CodeDomain', ns)
+        TextDomain = find(store, QuestionItem, './/datacollection:TextDomain') 
+        NumericDomain = find(store, QuestionItem, './/datacollection:NumericDomain') 
+        DateTimeDomain = find(store, QuestionItem, './/datacollection:DateTimeDomain') 
+        CodeDomain = find(store, QuestionItem, './/datacollection:CodeDomain')
 
         if TextDomain != None:
-            if TextDomain.find('r:Label', ns) == None:
+            if find(store, TextDomain, 'r:Label') == None:
                 Label = 'Generic text'
             else:
-                Label = TextDomain.find('r:Label/r:Content', ns).text
+                Label = find(store, TextDomain, 'r:Label/r:Content').text
 
             if 'minLength' in TextDomain.attrib.keys():
                 minLength = TextDomain.attrib['minLength']
@@ -360,186 +512,132 @@ def parse_QuestionItem(root):
             if Label == 'Generic text' and minLength == None and maxLength == None:
                 Label = 'Long text'
 
-            # which dup label to use
-            if Label in dup_label_list:
-                if 'minLength' in TextDomain.attrib.keys():
-                    minLength = TextDomain.attrib['minLength']
-                else:
-                    minLength = None
-
-                if 'maxLength' in TextDomain.attrib.keys():
-                    maxLength = TextDomain.attrib['maxLength']
-                else:
-                    maxLength = None
-
-                if minLength == None and maxLength == None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Min.isna()) & (df_r.Max.isna()) ,:]
-                elif minLength != None and maxLength == None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Min == minLength) & (df_r.Max.isna()) ,:]
-                elif minLength == None and maxLength != None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Min.isna()) & (df_r.Max == maxLength) ,:]
-                else:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Min == minLength) & (df_r.Max == maxLength) ,:]
-
-                Response = df_sub['Label'].values[0]
-            else:
-                Response = Label
+            Response = response_labels[response_key('Text', Label, Min=minLength, Max=maxLength)]
 
         elif NumericDomain != None:
-            if NumericDomain.find('r:Label', ns) == None:
+            if find(store, NumericDomain, 'r:Label') == None:
                 Label = 'Generic number'
             else:
-                Label = NumericDomain.find('r:Label/r:Content', ns).text
+                Label = find(store, NumericDomain, 'r:Label/r:Content').text
+
+            if find(store, NumericDomain, 'r:NumericTypeCode') == None:
+                NumericType = None
+            else:
+                NumericType = find(store, NumericDomain, 'r:NumericTypeCode').text
 
-            if NumericDomain.find('r:NumberRange/r:High', ns) == None:
+            if find(store, NumericDomain, 'r:NumberRange/r:Low') == None:
+                low_value = None
+            else:
+                low_value = find(store, NumericDomain, 'r:NumberRange/r:Low').text
+
+            if find(store, NumericDomain, 'r:NumberRange/r:High') == None:
                 high_value = None
             else:
-                high_value = NumericDomain.find('r:NumberRange/r:High', ns).text
+                high_value = find(store, NumericDomain, 'r:NumberRange/r:High').text
 
             if Label == 'Generic number' and high_value == None:
                 Label = 'Long number'
 
-            # find correct label
-            if Label in dup_label_list:
-                if NumericDomain.find('r:NumericTypeCode', ns) == None:
-                    NumericType = None
-                else:
-                    NumericType = NumericDomain.find('r:NumericTypeCode', ns).text
-
-                if NumericDomain.find('r:NumberRange/r:Low', ns) == None:
-                    low_value = None
-                else:
-                    low_value = NumericDomain.find('r:NumberRange/r:Low', ns).text
-
-                if NumericDomain.find('r:NumberRange/r:High', ns) == None:
-                    high_value = None
-                else:
-                    high_value = NumericDomain.find('r:NumberRange/r:High', ns).text
-
-                if NumericType == None and low_value == None and high_value == None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2.isna()) & (df_r.Min.isna()) & (df_r.Max.isna()) ,:]
-                elif NumericType == None and low_value == None and high_value != None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2.isna()) & (df_r.Min.isna()) & (df_r.Max == high_value) ,:]
-                elif NumericType == None and low_value != None and high_value == None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2.isna()) & (df_r.Min == low_value) & (df_r.Max.isna()) ,:]
-                elif NumericType != None and low_value == None and high_value == None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2 == NumericType) & (df_r.Min.isna()) & (df_r.Max.isna()) ,:]
-                elif NumericType == None and low_value != None and high_value != None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2.isna()) & (df_r.Min == low_value) & (df_r.Max == high_value) ,:]
-                elif NumericType != None and low_value != None and high_value == None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2 == NumericType) & (df_r.Min == low_value) & (df_r.Max.isna()) ,:]
-                elif NumericType != None and low_value == None and high_value != None:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2 == NumericType) & (df_r.Min.isna()) & (df_r.Max == high_value) ,:]
-                else:
-                    df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2 == NumericType) & (df_r.Min == low_value) & (df_r.Max == high_value) ,:]
-
-                Response = df_sub['Label'].values[0]
-            else:
-                Response = Label
-
+            Response = response_labels[response_key('Numeric', Label, NumericType, Min=low_value, Max=high_value)]
 
         elif DateTimeDomain != None:
             # select the correct label from response table
             Label = 'Generic date'
-            Response = Label
 
-            if DateTimeDomain.find('r:Label', ns) == None:
+            if find(store, DateTimeDomain, 'r:Label') == None:
                 Format = None
             else:
-                Format = DateTimeDomain.find('r:Label/r:Content', ns).text
+                Format = find(store, DateTimeDomain, 'r:Label/r:Content').text
 
-            if DateTimeDomain.find('r:DateTypeCode', ns) == None:
+            if find(store, DateTimeDomain, 'r:DateTypeCode') == None:
                 DateType = None
             else:
-                DateType = DateTimeDomain.find('r:DateTypeCode', ns).text
-
-            if Format == None and DateType == None:
-                df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.TypCodeDomaine2.isna()) &(df_r.Format.isna()) ,:]
-            elif Format != None and DateType == None:
-                df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2.isna()) &(df_r.Format == Format) ,:]
-            elif Format == None and DateType != None:
-                df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2 == DateType) &(df_r.Format.isna()) ,:]
-            else:
-                df_sub = df_r.loc[(df_r.Label.str.startswith(Label)) & (df_r.Type2 == DateType) &(df_r.Format == Format) ,:]
+                DateType = find(store, DateTimeDomain, 'r:DateTypeCode').text
 
-            Response = df_sub['Label'].values[0]
+            Response = response_labels[response_key('Date', Label, DateType, Format)]
 
         elif CodeDomain != None:
-            CodeID = CodeDomain.find('r:CodeListReference/r:ID', ns).text
-            Response = 'cs_' + codelist_df.loc[(codelist_df.ID == CodeID)]['Name'].unique().tolist()[0]
-            if CodeDomain.find('r:Label/r:Content', ns) != None:
-                CodeLabel = CodeDomain.find('r:Label/r:Content', ns).text
+            CodeID = find(store, CodeDomain, 'r:CodeListReference/r:ID').text
+            Response = 'cs_' + codelist_names[CodeID]
+            if find(store, CodeDomain, 'r:Label/r:Content') != None:
+                CodeLabel = find(store, CodeDomain, 'r:Label/r:Content').text
                 if Literal == None:
                     Literal = CodeLabel
         else:
             Response = 'Temp'
  
         qi_row = [ID, 'qi_' + Name, Literal, Instructions, Response, minimumResponses, maximumResponses ]
-        qi_df.loc[len(qi_df)] = qi_row
+        qi_rows.append(qi_row)
+
+    qi_df = pd.DataFrame(qi_rows, columns=columns, dtype=object)
     return qi_df
 
 
-def parse_QuestionGrid(root):
+@memoized
+def parse_QuestionGrid(store):
     """ 
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: there is only one questiongrid in this study, will conver it to question item
     """
     
     columns = ['QI_ID', 'Label', 'Literal', 'Instructions', 'Response', 'min_responses', 'max_responses']
 
-    qg_df = pd.DataFrame(columns=columns)
+    qg_rows = []
 
     l_id = []
     l_name = []
     qg_dict = dict()
-    QuestionGrids = root.findall('.//datacollection:QuestionGrid', ns) 
+    QuestionGrids = elements(store, 'datacollection:QuestionGrid') 
     for QuestionGrid in QuestionGrids:
-        ID = QuestionGrid.find('r:ID', ns).text
-        Name = QuestionGrid.find('datacollection:QuestionGridName/r:String', ns).text
+        ID = find(store, QuestionGrid, 'r:ID').text
+        Name = find(store, QuestionGrid, 'datacollection:QuestionGridName/r:String').text
         
-        if QuestionGrid.find('datacollection:QuestionText', ns) == None: 
+        if find(store, QuestionGrid, 'datacollection:QuestionText') == None: 
             Literal = None
         else:
-            Literal = QuestionGrid.find('datacollection:QuestionText/datacollection:LiteralText/datacollection:Text', ns).text
+            Literal = find(store, QuestionGrid, 'datacollection:QuestionText/datacollection:LiteralText/datacollection:Text').text
 
         # Numeric Domain
-        NumericDomains = QuestionGrid.findall('.//datacollection:NumericDomain', ns)
+        NumericDomains = findall(store, QuestionGrid, './/datacollection:NumericDomain')
         k = 1
         for NumericDomain in NumericDomains:
-            if NumericDomain.find('r:Label', ns) == None:
+            if find(store, NumericDomain, 'r:Label') == None:
                 Label = 'Generic number'
             else:
-                Label = NumericDomain.find('r:Label/r:Content', ns).text
+                Label = find(store, NumericDomain, 'r:Label/r:Content').text
 
             new_id = ID + '_' + str(k)
             new_name = Name + Label.split(' ')[0]
             qg_row = [new_id, 'qi_' + new_name, Literal.replace('\n', ''), None, Label, 1, 1 ]
-            qg_df.loc[len(qg_df)] = qg_row
+            qg_rows.append(qg_row)
             l_id.append(new_id)
             l_name.append(new_name)
             k = k + 1
+    qg_df = pd.DataFrame(qg_rows, columns=columns, dtype=object)
+
     qg_dict[ID] = ','.join(l_id)
     qg_dict[Name] = ','.join(l_name)
 
     return qg_df, qg_dict
 
 
-def parse_IfThenElse(root):
+@memoized
+def parse_IfThenElse(store):
     """ 
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: dataframe of Conditions
     """
     columns = ['IF_ID', 'IF_Label', 'IF_Label_logic', 'Literal', 'IfCondition', 'Then_ID', 'Then_type']
-    df_IfThenElse = pd.DataFrame(columns=columns)
+    if_rows = []
 
-    IfThenElses = root.findall('.//datacollection:IfThenElse', ns) 
+    IfThenElses = elements(store, 'datacollection:IfThenElse') 
     Name1  = None
     for IfThenElse in IfThenElses:
-        ID = IfThenElse.find('r:ID', ns).text
-        Name = IfThenElse.find('datacollection:ConstructName/r:String', ns).text
+        ID = find(store, IfThenElse, 'r:ID').text
+        Name = find(store, IfThenElse, 'datacollection:ConstructName/r:String').text
         Name = 'c_q' + Name.lower().replace('condition', '')
-        Label = IfThenElse.find('r:Label/r:Content', ns).text
-        IfCondition = IfThenElse.find('datacollection:IfCondition/r:Command/r:CommandContent', ns).text
+        Label = find(store, IfThenElse, 'r:Label/r:Content').text
+        IfCondition = find(store, IfThenElse, 'datacollection:IfCondition/r:Command/r:CommandContent').text
         if 'ff_' in IfCondition:
             IfCondition = None
         else:
@@ -557,93 +655,93 @@ def parse_IfThenElse(root):
             if len(Logic_variables) > 0:
                 Name1 = 'c_q' + Logic_variables[0]
 
-        for reference in IfThenElse.findall('datacollection:ThenConstructReference', ns):
-            Then_ID = reference.find('r:ID', ns).text
-            Then_type = reference.find('r:TypeOfObject', ns).text
+        for reference in findall(store, IfThenElse, 'datacollection:ThenConstructReference'):
+            Then_ID = find(store, reference, 'r:ID').text
+            Then_type = find(store, reference, 'r:TypeOfObject').text
 
             if_row = [ID, Name, Name1, Label.replace('\n', ''), IfCondition, Then_ID, Then_type]
-            df_IfThenElse.loc[len(df_IfThenElse)] = if_row
+            if_rows.append(if_row)
 
+    df_IfThenElse = pd.DataFrame(if_rows, columns=columns, dtype=object)
     return df_IfThenElse
  
 
-def parse_Loop(root):
+@memoized
+def parse_Loop(store):
     """ 
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: dataframe of Loop
     """
     columns = ['Loop_ID', 'Loop_Name', 'Literal', 'LoopWhile', 'ref_ID', 'ref_type']
-    df_Loop = pd.DataFrame(columns=columns)
+    loop_rows = []
 
-    Loops = root.findall('.//datacollection:Loop', ns) 
+    Loops = elements(store, 'datacollection:Loop') 
     for Loop in Loops:
-        ID = Loop.find('r:ID', ns).text
+        ID = find(store, Loop, 'r:ID').text
 
-        Label = Loop.find('r:Label/r:Content', ns).text
-        LoopWhile = Loop.find('datacollection:LoopWhile/r:Command/r:CommandContent', ns).text
+        Label = find(store, Loop, 'r:Label/r:Content').text
+        LoopWhile = find(store, Loop, 'datacollection:LoopWhile/r:Command/r:CommandContent').text
 
         # label should be associated with the variable.
         # in case of missing variable, using the first question name
         # this should be modified after find out the first question
-        if Loop.find('datacollection:ConstructName', ns) == None:
+        if find(store, Loop, 'datacollection:ConstructName') == None:
             Name = LoopWhile.replace('.', '').split(' ')[-1]
         else:
-            Name = Loop.find('datacollection:ConstructName/r:String', ns).text
+            Name = find(store, Loop, 'datacollection:ConstructName/r:String').text
 
         Name = 'l_q' + Name.lower().replace('loop', '').replace(' ', '')
 
-        for reference in Loop.findall('datacollection:ControlConstructReference', ns):
-            ref_ID = reference.find('r:ID', ns).text
-            ref_type = reference.find('r:TypeOfObject', ns).text
+        for reference in findall(store, Loop, 'datacollection:ControlConstructReference'):
+            ref_ID = find(store, reference, 'r:ID').text
+            ref_type = find(store, reference, 'r:TypeOfObject').text
 
             loop_row = [ID, Name, Label, LoopWhile, ref_ID, ref_type]
-            df_Loop.loc[len(df_Loop)] = loop_row
+            loop_rows.append(loop_row)
+
+    df_Loop = pd.DataFrame(loop_rows, columns=columns, dtype=object)
 
     # if name is not unique
     if not df_Loop['Loop_Name'].is_unique:
-
-        df_Loop['tmp'] = df_Loop.groupby('Loop_Name').cumcount() + 1
-        df_Loop['tmp_count'] = df_Loop.groupby('Loop_Name')['Loop_Name'].transform('count')
-
-        df_Loop['new_label_num'] = df_Loop.apply(lambda row: row['Loop_Name'] if row['tmp_count'] == 1 else row['Loop_Name'] + '_' + str(row['tmp']), axis=1)
-        df_Loop['new_label_roman'] = df_Loop.apply(lambda row: '_'.join([row['new_label_num'].rsplit('_',1)[0], int_to_roman(int( row['new_label_num'].rsplit('_',1)[1]))]) if row['tmp_count'] > 1 else row['new_label_num'], axis=1)
-
-        df_Loop['Loop_Label'] = df_Loop['new_label_roman']
+        df_Loop['Loop_Label'] = suffix_duplicates(df_Loop['Loop_Name'])
     else:
         df_Loop['Loop_Label'] = df_Loop['Loop_Name']
 
     return df_Loop
 
 
-def parse_Sequence(root):
+@memoized
+def parse_Sequence(store):
     """
-    input: root of ET xml
+    input: fragment store of the xml (fragment_store)
     output: sequence element 
     """
 
-    df_QC = parse_QuestionConstruct(root)
-    df_statement = parse_StatementItem(root)
-    df_if = parse_IfThenElse(root)
-    df_loop = parse_Loop(root)
+    df_QC = parse_QuestionConstruct(store)
+    df_statement = parse_StatementItem(store)
+    df_if = parse_IfThenElse(store)
+    df_loop = parse_Loop(store)
 
     columns = ['ID', 'Label', 'CCRef_ID', 'CCRef_type']
-    df_seq = pd.DataFrame(columns=columns)
+    seq_rows = []
 
-    sequences = root.findall('./ddi:Fragment/datacollection:Sequence', ns)   
+    sequences = fragments(store, 'datacollection:Sequence')   
     for sequence in sequences:
-        ID = sequence.find('r:ID', ns).text
-        Label = sequence.find('r:Label/r:Content', ns).text
-        for ref in sequence.findall('datacollection:ControlConstructReference', ns):
-            ref_ID = ref.find('r:ID', ns).text
-            ref_type = ref.find('r:TypeOfObject', ns).text
+        ID = find(store, sequence, 'r:ID').text
+        Label = find(store, sequence, 'r:Label/r:Content').text
+        for ref in findall(store, sequence, 'datacollection:ControlConstructReference'):
+            ref_ID = find(store, ref, 'r:ID').text
+            ref_type = find(store, ref, 'r:TypeOfObject').text
 
             seq_row = [ID, Label, ref_ID, ref_type]
-            df_seq.loc[len(df_seq)] = seq_row
+            seq_rows.append(seq_row)
             
+    df_seq = pd.DataFrame(seq_rows, columns=columns, dtype=object)
+
     df_seq_qc = df_seq.merge(df_QC, left_on='CCRef_ID', right_on='QC_ID', how='left')
 
     # modify sequence table question grid to question item
-    df_QG, qg_dict = parse_QuestionGrid(root)
+    df_QG, qg_dict = parse_QuestionGrid(store)
 
     df_seq_qc['QC_Name_new'] = df_seq_qc['QC_Name'].apply(lambda x: qg_dict[x] if x in qg_dict.keys() else x)
     df_seq_qc['QuestionReference_id_new'] = df_seq_qc['QuestionReference_id'].apply(lambda x: qg_dict[x] if x in qg_dict.keys() else x)
@@ -655,14 +753,14 @@ def parse_Sequence(root):
     return df_seq_qc
 
 
-def get_sequence_table(root):
+def get_sequence_table(store):
     """
     input: parsed 'instrument' and 'sequence'
     output: sequence table 
     """
 
-    df_Study = parse_study(root)
-    df_Instrument = parse_Instrument(root)
+    df_Study = parse_study(store)
+    df_Instrument = parse_Instrument(store)
     df = df_Study.merge(df_Instrument, left_on = 'Instrument', right_on = 'Instrument_ID', how='left')
 
     df_sub = df.loc[:, ['Instrument_Label', 'Study_Label']]
@@ -685,13 +783,13 @@ def get_sequence_table(root):
     return df_s, df_sub
 
 
-def get_codelist_table(root):
+def get_codelist_table(store):
     """
     input: parsed 'codelist'
     output: codelist table 
     """
 
-    df_codelist = parse_codelist(root)
+    df_codelist = parse_codelist(store)
     df = df_codelist.loc[:, ['Name', 'Value', 'Category']]
     
     df['Code_Order'] = df.groupby('Name').cumcount() + 1
@@ -704,64 +802,101 @@ def get_codelist_table(root):
     return df
 
 
-def get_position(root):
+def construct_graph(store):
     """
-    find parent relationship and position
+    The control construct relationships, loaded once:
+        - children: sequence ID -> (construct ID, ID used in the tables) of its children in order,
+          the ID used in the tables is the question item of a question construct (one per item of the question grid)
+        - parents: loop, condition and instrument ID -> (Parent_Type, Parent_Name, [(ID, type) of the constructs it references]),
+          loops first, then conditions, then instruments, each in document order
     """
+    df_Sequence = parse_Sequence(store)
+    df_IfThenElse = parse_IfThenElse(store)
+    df_Loop = parse_Loop(store)
+    df_instrument = parse_Instrument(store) 
 
-    df_Sequence = parse_Sequence(root)
-    df_IfThenElse = parse_IfThenElse(root)
-    df_Loop = parse_Loop(root)
-    df_instrument = parse_Instrument(root) 
+    children = defaultdict(list)
+    for ID, CCRef_ID, QuestionReference_id in zip(df_Sequence['ID'], df_Sequence['CCRef_ID'], df_Sequence['QuestionReference_id']):
+        children[ID].append((CCRef_ID, CCRef_ID if pd.isnull(QuestionReference_id) else QuestionReference_id))
 
-    # position from parsed loops
-    df_loop_seq = df_Loop.merge(df_Sequence, left_on='ref_ID', right_on='ID', how='left')
-    df_loop_seq['Position'] = df_loop_seq.groupby(['Loop_ID']).cumcount() + 1
-    df_loop_seq['new_ID'] = df_loop_seq.apply(lambda row: row['CCRef_ID'] if pd.isnull(row['QuestionReference_id']) else row['QuestionReference_id'], axis=1)
-    df_loop_seq['Parent_Type'] = 'CcLoop'
-    df_loop_pos = df_loop_seq.loc[:, ['new_ID', 'Parent_Type', 'Loop_ID', 'Loop_Name', 'Position']]
-    df_loop_pos.rename(columns={'Loop_ID': 'Parent_ID', 'Loop_Name': 'Parent_Name'}, inplace=True)
+    parents = dict()
+    for Parent_Type, IDs, names, refs, ref_types in [('CcLoop', df_Loop['Loop_ID'], df_Loop['Loop_Name'], df_Loop['ref_ID'], df_Loop['ref_type']),
+                                                     ('CcCondition', df_IfThenElse['IF_ID'], df_IfThenElse['IF_Label'], df_IfThenElse['Then_ID'], df_IfThenElse['Then_type']),
+                                                     ('CcSequence', df_instrument['Instrument_ID'], df_instrument['Instrument_Label'], df_instrument['ref_ID'], df_instrument['ref'])]:
+        for ID, Name, ref_ID, ref_type in zip(IDs, names, refs, ref_types):
+            parents.setdefault(ID, (Parent_Type, Name, []))[2].append((ref_ID, ref_type))
 
-    # position from parsed conditions
-    df_if_seq = df_IfThenElse.merge(df_Sequence, left_on='Then_ID', right_on='ID', how='left')
-    df_if_seq['Position'] = df_if_seq.groupby(['IF_ID']).cumcount() + 1
-    df_if_seq['new_ID'] = df_if_seq.apply(lambda row: row['CCRef_ID'] if pd.isnull(row['QuestionReference_id']) else row['QuestionReference_id'], axis=1)
-    df_if_seq['Parent_Type'] = 'CcCondition'
-    df_if_pos = df_if_seq.loc[:, ['new_ID', 'Parent_Type', 'IF_ID', 'IF_Label', 'Position']]
-    df_if_pos.rename(columns={'IF_ID': 'Parent_ID', 'IF_Label': 'Parent_Name'}, inplace=True)
+    return children, parents
 
-    # position from parsed instrument
-    df_inst_seq = df_instrument.merge(df_Sequence, left_on='ref_ID', right_on='ID', how='left')
-    df_inst_seq['Position'] = df_inst_seq.groupby(['Instrument_ID']).cumcount() + 1
-    df_inst_seq['new_ID'] = df_inst_seq.apply(lambda row: row['CCRef_ID'] if pd.isnull(row['QuestionReference_id']) else row['QuestionReference_id'], axis=1)
-    df_inst_seq['Parent_Type'] = 'CcSequence'
-    df_inst_pos = df_inst_seq.loc[:, ['new_ID', 'Parent_Type', 'Instrument_ID', 'Instrument_Label', 'Position']]
-    df_inst_pos.rename(columns={'Instrument_ID': 'Parent_ID', 'Instrument_Label': 'Parent_Name'}, inplace=True)
 
-    df = pd.concat([df_loop_pos, df_if_pos, df_inst_pos])
-    df['Branch'] = df['Parent_Type'].apply(lambda x: 0 if x == 'CcCondition' else 1)
+def get_position(store):
+    """
+    find parent relationship and position:
+    one depth-first traversal from each instrument's root sequence, the referenced sequences are replaced by their children
+    and loops and conditions are entered when they are reached, so nesting depth does not matter.
+    Loops and conditions that no instrument reaches are traversed afterwards.
+    """
+    children, parents = construct_graph(store)
+
+    def parent_children(parent_ID):
+        for ref_ID, ref_type in parents[parent_ID][2]:
+            if ref_type == 'Sequence':
+                for child in children.get(ref_ID, []):
+                    yield child
+            else:
+                yield ref_ID, ref_ID
+
+    order = {ID: n for n, ID in enumerate(parents)}
+    roots = [ID for ID, (Parent_Type, Name, refs) in parents.items() if Parent_Type == 'CcSequence']
+    roots = roots + [ID for ID in parents if ID not in roots]
+
+    rows = []
+    visited = set()
+    for root in roots:
+        if root in visited:
+            continue
+        visited.add(root)
+        stack = [[root, parent_children(root), 0]]
+        while stack:
+            frame = stack[-1]
+            child = next(frame[1], None)
+            if child is None:
+                stack.pop()
+                continue
+            CCRef_ID, new_ID = child
+            parent_ID = frame[0]
+            frame[2] += 1
+            Parent_Type, Parent_Name, refs = parents[parent_ID]
+            rows.append((new_ID, Parent_Type, parent_ID, Parent_Name, frame[2], order[parent_ID]))
+            if CCRef_ID in parents and CCRef_ID not in visited:
+                visited.add(CCRef_ID)
+                stack.append([CCRef_ID, parent_children(CCRef_ID), 0])
+
+    # rows of one parent together, loops then conditions then instruments as the tables are merged in that order
+    rows.sort(key=lambda row: (row[5], row[4]))
+    df = pd.DataFrame([row[:5] for row in rows], columns=['new_ID', 'Parent_Type', 'Parent_ID', 'Parent_Name', 'Position'])
+    df['Branch'] = (df['Parent_Type'] != 'CcCondition').astype(int)
 
     return df
    
 
-def get_ordered_tables(root):
-    df_pos = get_position(root)
+def get_ordered_tables(store):
+    df_pos = get_position(store)
 
     statement_columns = ['Label', 'Literal', 'Parent_Type', 'Parent_Name', 'Branch', 'Position']
-    df_StatementItem = parse_StatementItem(root)
+    df_StatementItem = parse_StatementItem(store)
     df_statement = df_StatementItem.merge(df_pos, left_on = 'Statement_ID', right_on='new_ID', how='left')
     df_statement.rename(columns={'Statement_Name': 'Label'}, inplace=True)
     df_statement = df_statement[statement_columns]
 
     if_columns = ['Label', 'Label_logic', 'Literal', 'Logic', 'Parent_Type', 'Parent_Name', 'Branch', 'Position']
-    df_IfThenElse = parse_IfThenElse(root)
+    df_IfThenElse = parse_IfThenElse(store)
     df_if = df_IfThenElse.merge(df_pos, left_on = 'IF_ID', right_on='new_ID', how='left')
     df_if.rename(columns={'IF_Label': 'Label', 'IF_Label_logic': 'Label_logic', 'IfCondition': 'Logic'}, inplace=True)
-    df_IfThenElse = parse_IfThenElse(root)
     df_if = df_if[if_columns]
 
     loop_columns = ['Label', 'Loop_While', 'Start_value', 'End_Value', 'Variable', 'Parent_Type', 'Parent_Name', 'Branch', 'Position']
-    df_Loop_p = parse_Loop(root)
+    df_Loop_p = parse_Loop(store)
     df_loop = df_Loop_p.merge(df_pos, left_on = 'Loop_ID', right_on='new_ID', how='left')
     df_loop.rename(columns={'Loop_Label': 'Label', 'LoopWhile': 'Loop_While'}, inplace=True)
     df_loop['Start_value'] = None
@@ -770,8 +905,8 @@ def get_ordered_tables(root):
     df_loop = df_loop[loop_columns]
 
     QI_columns = ['Label', 'Literal', 'Instructions', 'Response', 'Parent_Type', 'Parent_Name', 'Branch', 'Position', 'min_responses', 'max_responses']
-    df_QI_p = parse_QuestionItem(root)
-    df_QG_p, qg_dict = parse_QuestionGrid(root)
+    df_QI_p = parse_QuestionItem(store)
+    df_QG_p, qg_dict = parse_QuestionGrid(store)
     df_QI_all =pd.concat([df_QI_p, df_QG_p])
 
     # Removed DERIVED questions
@@ -789,59 +924,58 @@ def get_ordered_tables(root):
     return df_statement, df_if, df_loop, df_QI
 
 
-def modify_label(root):
+def modify_label(store):
     """
         - conditon labels should be labelled after the question in the condition logic. 
           - If there isn't logic then it should be labelled after the first question inside the condition.
         - Loop has no variable, using the first question name for it's label
     """
 
-    df_statement, df_if, df_loop, df_QI = get_ordered_tables(root)
+    df_statement, df_if, df_loop, df_QI = get_ordered_tables(store)
 
     # first question in loop
     df_QI_sub = df_QI.loc[(df_QI['Parent_Type'] == 'CcLoop') & (df_QI['Position'] == 1), ['Label', 'Parent_Name']]
     df_QI_sub['new_Parent_Name'] = 'l_' + df_QI['Label'].str.replace('qi_', '')
     new_loop_dict = dict(zip(df_QI_sub.Parent_Name, df_QI_sub.new_Parent_Name)) 
     
-    df_loop['Label'] = df_loop['Label'].apply(lambda x: new_loop_dict[x] if x in new_loop_dict.keys() else x)
-    df_QI['Parent_Name'] = df_QI['Parent_Name'].apply(lambda x: new_loop_dict[x] if x in new_loop_dict.keys() else x)
+    df_loop['Label'] = df_loop['Label'].map(new_loop_dict).fillna(df_loop['Label'])
+    df_QI['Parent_Name'] = df_QI['Parent_Name'].map(new_loop_dict).fillna(df_QI['Parent_Name'])
 
     # first question in condition
     df_QI_c = df_QI.loc[(df_QI['Parent_Type'] == 'CcCondition') & (df_QI['Position'] == 1), ['Label', 'Parent_Name']]
     df_QI_c['new_Parent_Name'] = df_QI['Label'].str.replace('qi_', '')
     new_cond_dict = dict(zip(df_QI_c.Parent_Name, df_QI_c.new_Parent_Name)) 
 
+    # logic of each condition label, the first row of the label
+    if_logic = dict()
+    for Label, Logic, Label_logic in zip(df_if['Label'], df_if['Logic'], df_if['Label_logic']):
+        if_logic.setdefault(Label, (Logic, Label_logic))
+
     # only keep those without logic variable
     cond_label_dict = dict()
     for k in new_cond_dict.keys():
         v = 'c_q' + new_cond_dict[k]
-        if df_if.loc[(df_if['Label'] == k) , 'Logic'].values[0] is None:
+        Logic, Label_logic = if_logic[k]
+        if Logic is None:
             cond_label_dict[k] = v
-        elif 'qc_' not in df_if.loc[(df_if['Label'] == k) , 'Logic'].values[0]:
+        elif 'qc_' not in Logic:
             cond_label_dict[k] = v
         else:
-            cond_label_dict[k] = 'c_q' + df_if.loc[(df_if['Label'] == k) , 'Label_logic'].values[0]
+            cond_label_dict[k] = 'c_q' + Label_logic
 
     df_if['IF_Name'] = df_if.apply(lambda row: row['Label_logic'] if not pd.isnull(row['Label_logic']) else cond_label_dict[row['Label_logic']] if row['Label_logic'] in cond_label_dict.keys() else row['Label'], axis=1)
 
     # if name is not unique
     if not df_if['IF_Name'].is_unique:
-
-        df_if['tmp'] = df_if.groupby('IF_Name').cumcount() + 1
-        df_if['tmp_count'] = df_if.groupby('IF_Name')['IF_Name'].transform('count')
-
-        df_if['new_label_num'] = df_if.apply(lambda row: row['IF_Name'] if row['tmp_count'] == 1 else row['IF_Name'] + '_' + str(row['tmp']), axis=1)
-        df_if['new_label_roman'] = df_if.apply(lambda row: '_'.join([row['new_label_num'].rsplit('_',1)[0], int_to_roman(int( row['new_label_num'].rsplit('_',1)[1]))]) if row['tmp_count'] > 1 else row['new_label_num'], axis=1)
-
-        df_if['Label_new'] = df_if['new_label_roman']
+        df_if['Label_new'] = suffix_duplicates(df_if['IF_Name'])
     else:
         df_if['Label_new'] = df_if['IF_Name']
 
     if_dict = dict(zip(df_if.Label, df_if.Label_new)) 
     
-    df_QI['Parent_Name'] = df_QI['Parent_Name'].apply(lambda x: if_dict[x] if x in if_dict.keys() else x)
-    df_statement['Parent_Name'] = df_statement['Parent_Name'].apply(lambda x: if_dict[x] if x in if_dict.keys() else x)
-    df_loop['Parent_Name'] = df_loop['Parent_Name'].apply(lambda x: if_dict[x] if x in if_dict.keys() else x)
+    df_QI['Parent_Name'] = df_QI['Parent_Name'].map(if_dict).fillna(df_QI['Parent_Name'])
+    df_statement['Parent_Name'] = df_statement['Parent_Name'].map(if_dict).fillna(df_statement['Parent_Name'])
+    df_loop['Parent_Name'] = df_loop['Parent_Name'].map(if_dict).fillna(df_loop['Parent_Name'])
 
     df_if = df_if.drop(['Label', 'Label_logic'], 1)
     df_if.rename(columns={'Label_new': 'Label'}, inplace=True)
@@ -878,7 +1012,7 @@ def improve_archivist(df_response, df_QI):
     return df_response_new, df_QI
     
 
-def main():
+def main(backend=DEFAULT_BACKEND):
     main_dir = '../Jenny_ucl/us_covid19_xml/2020_07'
     input_name = 'UKHLSCovidJul20_v01.xml'
     xmlFile = os.path.join(main_dir, input_name)
@@ -888,25 +1022,24 @@ def main():
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    tree = ET.parse(xmlFile, parser=ET.XMLParser(encoding="utf-8"))
-    root = tree.getroot()
+    root = read_xml(xmlFile, backend)
+    store = fragment_store(root)
 
     # inspect xml
-    section_names = set([i.tag for i in root.findall('./ddi:Fragment/', ns)])
+    section_names = set(store['fragments'].keys())
     for section_name in section_names:
         print("****** {} ******".format(section_name))
 
-    get_ordered_tables(root)
-    df_study, df_sequence = get_sequence_table(root)
+    df_study, df_sequence = get_sequence_table(store)
     df_study.to_csv(os.path.join(output_dir, 'study.csv'), index=False, sep='\t')
     df_sequence.to_csv(os.path.join(output_dir, 'sequence.csv'), index=False, sep='\t')
 
-    df_response, dup_label_list = parse_response(root)
+    df_response, dup_label_list = parse_response(store)
 
-    df_codelist = get_codelist_table(root)
+    df_codelist = get_codelist_table(store)
     df_codelist.to_csv(os.path.join(output_dir, 'codelist.csv'), index=False, sep='\t')
 
-    df_statement, df_if, df_loop, df_QI = modify_label(root)
+    df_statement, df_if, df_loop, df_QI = modify_label(store)
     df_statement.to_csv(os.path.join(output_dir, 'statement.csv'), index=False, sep='\t')
     df_if.to_csv(os.path.join(output_dir, 'condition.csv'), index=False, sep='\t')
     df_loop.to_csv(os.path.join(output_dir, 'loop.csv'), index=False, sep='\t')
@@ -917,4 +1050,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Parse us covid19 xml file')
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_BACKEND, help='xml library, lxml with compiled XPath or xml.etree.ElementTree')
+    args = parser.parse_args()
+    main(backend=args.backend)
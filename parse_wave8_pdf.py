@@ -11,6 +11,8 @@ import pdfplumber
 import re
 import os
 
+import debug_artifacts
+
 
 def do_replace(s, d):
     """
@@ -532,7 +534,7 @@ def get_question_item(question_item, order_question):
     df_order['new_name'] = df_order['Label'].map(lambda x: re.sub('(_\d+)$', '', x))
 
     df_QI = pd.merge(df_question_item.loc[:, keep_col], df_order, how='right', left_on='Name', right_on='new_name')
-    df_QI.to_csv('TEMP.csv', sep = ';', index=False)
+    debug_artifacts.dump('questions', df_QI, 'TEMP.csv', sep = ';', index=False)
 
     df_QI['code_name_old'] = 'cs_' + df_QI['Label_y']
     df_QI['code_name'] = df_QI['code_name_old'].map(lambda x: re.sub('(_\d+)$', '', x) if not pd.isnull(x) else x)
@@ -847,7 +849,7 @@ def main():
     df_mod_pos['New'] = df_mod_pos.groupby('above_label').cumcount()
     mod_dict = dict(zip(df_mod_pos.Label, df_mod_pos.New))
 
-    df_mod_pos.to_csv('TMP.csv', sep=';')
+    debug_artifacts.dump('positions', df_mod_pos, 'TMP.csv', sep=';')
 
     qi_cols = ['Label', 'Literal', 'Response_domain', 'above_label', 'Position', 'parent_type']
     df_qi_add = df_qg_horizontal[qi_cols]
@@ -864,6 +866,7 @@ def main():
     pd.DataFrame(columns=df_question_grid.columns).to_csv(os.path.join(db_input_dir, 'wave8_question_grid.csv'), sep='@', index=False)
     df_condition.to_csv(order_condition, sep=';', index=False)
     df_loop.to_csv(order_loop, sep=';', index=False)
+    debug_artifacts.flush()
 
 
 if __name__ == "__main__":
@@ -9,27 +9,7 @@ import pandas as pd
 import numpy as np
 from datetime import date
 
-def isNaN(num):
-    return num != num
-
-
-def find_parent(start, stop, df_mapping, source, section_label):
-    """
-        Find the parent label and parent source
-    """
-    if isNaN(stop):
-        df = df_mapping.loc[(df_mapping.Order < start) & (df_mapping.End > start), :]
-    else:
-        df = df_mapping.loc[(df_mapping.Order < start) & (df_mapping.End > stop), :]
-
-    if source == 'Sequences':
-        return section_label
-    elif not df.empty:
-        df['dist'] = start - df['Order']
-        df_r = df.loc[df['dist'].idxmin()]
-        return df_r['Label']
-    else:
-        return section_label
+from nesting import assign_parents
 
 
 def main():
@@ -153,13 +133,15 @@ def main():
     df_mapping = df_all_new.loc[ df_all.End > 0, ['Label', 'source', 'Order', 'End']]
 
     # find above label
-    for index,row in df_all_new.iterrows():
-        df_all_new.at[index, 'above_label'] = find_parent(row['Order'], row['End'], df_mapping, row['source'], row['section_label'])
+    above_label, parent_type, position = assign_parents(df_all_new['Order'], df_all_new['End'], df_all_new['section_label'],
+                                                        df_all_new['source'] == 'Sequences',
+                                                        df_mapping['Order'], df_mapping['End'], df_mapping['Label'])
+    df_all_new['above_label'] = above_label
 
     # calculate position
-    df_all_new['Position'] = df_all_new.groupby('above_label').cumcount() + 1
+    df_all_new['Position'] = position
 
-    df_all_new['parent_type'] = df_all_new['above_label'].apply(lambda x: 'CcCondition' if x[0:1] == 'c'  else 'CcLoop' if x[0:1] == 'l' else 'CcSequence')
+    df_all_new['parent_type'] = parent_type
 
     df_all_new['branch'] = 0
     cols = ['section_id', 'branch', 'Position']
@@ -10,6 +10,9 @@ import pandas as pd
 import numpy as np
 from datetime import date
 
+from labeling import suffix_duplicates
+
+
 def main():
     input_dir = '../Jenny_ucl/ucl_covid19'
     fn = os.path.join(input_dir, 'Covid-19_version4_Hayley.xls') 
@@ -64,7 +67,7 @@ def main():
     df_questions['label'] = df_questions['label'].str.replace('qc_', 'qi_')
 
     # deal with same label name
-    df_questions['label'] = df_questions['label'] + '_' + df_questions.groupby('label').cumcount().astype(str)
+    df_questions['label'] = suffix_duplicates(df_questions['label'], start=0, number=str, keep_single=False)
     df_questions['label'] = df_questions['label'].str.replace('_0', '')
 
     df_questions['Response_domain'] = df_questions['Response_domain'].str.rstrip()
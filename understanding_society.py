@@ -0,0 +1,853 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Python 3
+    Shared engine for the understanding society xml (qsrx) parsers,
+    the differences between waves live in us_config/wave<N>.json
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import xml.etree.ElementTree as ET
+import pandas as pd
+import json
+import time
+import re
+import os
+
+from labeling import unique_labeler, suffix_duplicates
+from codelists import dedupe_codelists
+import debug_artifacts
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'us_config')
+
+
+def extractText(node):
+    """Extract text from all <something> of an elementree node."""
+    chunks = []
+    for sub in node.iter():
+        add_brackets = False
+        if sub.tag == 'format' and sub.attrib['code'] == 'TF':
+            add_brackets = True 
+        if sub.text is not None:
+            if add_brackets:
+                chunks.append('[')
+            chunks.append(sub.text)
+            if add_brackets:
+                chunks.append(']')
+        if sub.tail is not None:
+            chunks.append(sub.tail)
+
+    return "".join(chunks)
+
+
+# columns of the tables built in TreeToTables, rows are collected as tuples and turned into one DataFrame per table at the end
+QI_COLUMNS = ['QuestionLabel', 'Label', 'Literal', 'Instructions', 'Response']
+CODELIST_COLUMNS = ['Label', 'Order', 'Value', 'Category']
+RESPONSE_COLUMNS = ['Label', 'Type', 'Numeric_Type/Datetime_type', 'Min', 'Max']
+SEQUENCE_COLUMNS = ['ModuleName', 'Label']
+PARENT_COLUMNS = ['parent_type', 'parent_name', 'branch', 'global_pos']
+
+
+def get_question_response(question_element):
+    """ 
+        from question element, find it's response 
+        returns the question item row, the response rows and the code list rows
+    """
+
+    qi_label = 'qi_' + question_element.find('./context').text
+    if not question_element.find('./qt_properties/text') is None:
+        literal_node = question_element.find('./qt_properties/text')
+        qi_literal = extractText(literal_node)
+    else:
+        qi_literal = ''
+
+    if not question_element.find('./qt_properties/iiposttext') is None:
+        qi_instruction = extractText(question_element.find('./qt_properties/iiposttext'))
+    elif not question_element.find('./qt_properties/iipretext') is None:
+        qi_instruction = extractText(question_element.find('./qt_properties/iipretext'))
+    else:
+        qi_instruction = ''
+
+    # shift instruction to literal
+    if qi_literal == '' and qi_instruction != '':
+        qi_literal = qi_instruction
+        qi_instruction = ''
+
+    codelist_rows = []
+    response_rows = []
+
+    question_label = question_element.attrib['name'] 
+    question_label = 'qi_' + question_label.replace('.', '_')
+
+    # from this quesion, find it's code list
+    if question_element.attrib['type'] in ('choice', 'multichoice'):
+        response_label = 'cs_' + question_label.replace('qi_', '')
+        response_label = response_label.replace('.', '_')
+
+        for index, item in enumerate( question_element.findall('./qt_properties/options/option') ):
+           codelist_rows.append((response_label, index+1, item.attrib['value'], item.find('./label').text))
+
+    # datetime response
+    elif question_element.attrib['type'] in ('date', 'time'): 
+        response_label = 'DATETYPE'
+        response_rows.append((response_label, 'Datetime', 'Date', None, None))
+    # text response
+    elif question_element.attrib['type'] in ('text', 'string'): 
+        response_label = 'Generic text'
+        response_rows.append((response_label, 'Text', None, None, None))
+    # numeric response
+    elif question_element.attrib['type'] == 'number':
+        decim = question_element.find('./qt_properties/decimals').text
+        if decim == '0':
+            Numeric_Type = 'Integer'
+        else:
+            Numeric_Type = 'Float'
+
+        if not question_element.find('./qt_properties/range') is None: 
+            e = question_element.find('./qt_properties/range')
+
+            if 'min' in e.attrib.keys():
+                min_v = e.attrib['min']
+            else:
+                min_v = None
+            if 'max' in e.attrib.keys():
+                max_v = e.attrib['max']
+            else:
+                max_v = None
+            response_label = 'Range: ' + min_v + '-' + max_v 
+
+        else:
+            response_label = 'How many'
+            min_v = None
+            max_v = None
+        response_rows.append((response_label, 'Numeric', Numeric_Type, min_v, max_v))
+    else:
+        #print(question_element.attrib['type'])
+        response_label = 'TOCHECK'
+
+    qi_row = (question_label, qi_label, qi_literal, qi_instruction, response_label)
+
+    return qi_row, response_rows, codelist_rows
+
+
+def get_sequence(sequence_element):
+    """
+        Find sequence label, returns the sequence row
+    """
+    ModuleName = sequence_element.attrib['name']
+    label = sequence_element.find('./rm_properties/label').text
+
+    return (ModuleName, label)
+
+
+# only interested in module/question/condition/loop relationship
+USEFUL_TAGS = ('qsrx', 'module', 'if', 'loop', 'question')
+
+
+# elements that become rows of the tables
+TABLE_TAGS = ('question', 'module', 'if', 'loop')
+
+
+def useful_record(e):
+    """the parent record children get from e: its tag, and its key once the element is processed"""
+    return {'tag': e.tag, 'MYKEY': e.get('MYKEY')} if e.tag in USEFUL_TAGS else None
+
+
+def iter_useful_parent(root):
+    """
+    Depth-first walk in document order (like root.iter()), yields
+        (element, record of its closest ancestor whose tag is in USEFUL_TAGS (None for root), its own record, global_pos)
+    The stack holds the elements still to visit with the useful ancestor their children get,
+    so no child-to-parent map of the whole tree is needed.
+    """
+    stack = [(root, None)]
+    global_pos = 0
+    while stack:
+        e, parent = stack.pop()
+        global_pos += 1
+        own = useful_record(e)
+        yield e, parent, own, global_pos
+        child_parent = parent if own is None else own
+        stack.extend((c, child_parent) for c in reversed(list(e)))
+
+
+def iterparse_useful_parent(xmlFile):
+    """
+    Streaming version of iter_useful_parent with iterparse start/end events:
+    an element is yielded at its end, when its subtree is complete, with the global_pos of its start.
+    A table element is cleared and removed from its parent element once it is yielded, other elements
+    as soon as they are not inside an open table element, so only the chain of open elements
+    and the children still to be read by an open table element are kept.
+    """
+    stack = []
+    open_elements = []
+    global_pos = 0
+    open_tables = 0
+    for event, e in ET.iterparse(xmlFile, events=('start', 'end')):
+        if event == 'start':
+            global_pos += 1
+            parent = stack[-1][1] if stack else None
+            own = useful_record(e)
+            stack.append((parent, parent if own is None else own, own, global_pos))
+            open_elements.append(e)
+            if e.tag.lower() in TABLE_TAGS:
+                open_tables += 1
+        else:
+            parent, _, own, pos = stack.pop()
+            open_elements.pop()
+            yield e, parent, own, pos
+            is_table = e.tag.lower() in TABLE_TAGS
+            if is_table:
+                open_tables -= 1
+            if is_table or open_tables == 0:
+                e.clear()
+                if open_elements:
+                    open_elements[-1].remove(e)
+
+
+def get_useful_parent_info(parent):
+    """Get some info about the meaningful parent (its record)."""
+
+    # TODO: change MYKEY to meaningful
+    parent_key = parent.get('MYKEY')   # returns None if can't find
+    # parent_type = parent.tag
+    parent_type = 'CcSequence' if parent['tag'] == 'module' else 'CcCondition' if parent['tag'] == 'if' else 'CcLoop' if parent['tag'] == 'loop' else ''
+    if parent['tag'] == 'if' and parent_key is None:
+        raise RuntimeError('oh no')
+    branch = 0 if parent_type == 'CcCondition' else 1
+    return parent_type, parent_key, branch
+
+
+def TreeToTables(elements):
+    """ 
+    Do a Depth-first search (DFS) from root.
+
+    Visit the nodes of the tree in DFS order.  Certain type of elements
+    are inserted into tables (the return values below).  The elements
+    need some processing to locate meaningful parents.
+
+    The content of each element is read while walking, keys and parents
+    are filled in afterwards in document order, so the walk can also be
+    a stream of finished subtrees.
+
+    Args:
+        elements: (element, parent record, own record, global_pos) from
+            iter_useful_parent(root) or iterparse_useful_parent(xmlFile).
+
+    Returns:
+        df_qi (df): question items table
+        df_response (df): etc
+        df_codelist (df):
+        df_condition (df):
+        df_sequence (df):
+        df_loop (df):
+
+    tODO: check this todo ;)
+    """
+
+    def do_if(e):
+        """process a "if" element, extracting data needed for a row in the If Table.
+
+        Args:
+            An element of a elementree
+
+        Returns:
+            k (str): the key/label that was generated from the logic of
+                the element. May not be unique.
+            row (tuple): a row of data for the table.
+	"""
+        logic = extractText(e.find('./condition'))
+
+        if e.find('./sd_properties/label') is None:
+            literal = ''
+        else:
+            literal = e.find('./sd_properties/label').text
+ 
+        if any(ext in logic for ext in ['=', '>', '<']):
+            l = re.findall(r'(\w*\.*\w+) *(=|>|<)', logic)
+            if l != []:
+                k_all = [item[0] for item in l]
+                k = l[0][0]
+            else:
+                all_capital_words = [word for word in logic.split(' ') if word[0].isupper() ]
+                if all_capital_words == []:
+                    k = logic.split(' ')[0]
+                else:
+                    k = all_capital_words[0]
+                k_all = [k]
+        else:
+            all_capital_words = [word for word in logic.split(' ') if word[0].isupper() ]
+            if all_capital_words == []:
+                k = logic.split(' ')[0]
+            else:
+                k = all_capital_words[0]   
+
+            k_all = [k]
+
+        k = 'c_q' + k
+  
+        # add qc_ to the question namesiipretext
+        for st in set(k_all):
+            if st in logic:
+                logic = logic.replace(st, 'qc_' + st)
+
+        logic = logic.replace('=', " == ").replace('<>', ' != ').replace(' | ', ' || ').replace(' OR ', ' || ').replace(' or ', ' || ').replace(' & ', ' && ').replace(' AND ', ' && ').replace(' and ', ' && ')
+
+        return k, (literal, logic, k_all)
+
+
+    def do_loop(e):
+        """process a loop element, extracting data needed for a row in the Loop Table.
+ 
+        Args:
+            An element of a elementree
+
+        Returns:
+            k (str): the key/label that was generated from the loop_while
+                of the element. May not be unique.
+            row (tuple): a row of data for the table.
+	"""
+        loop_while = e.attrib['args']
+        if e.find('./sd_properties/label') is None: 
+            loop_label = ''
+        else:
+            loop_label = e.find('./sd_properties/label').text  
+
+        if loop_label != '':
+            k = loop_label.split(' ')[0]
+        elif any(ext in loop_while for ext in ['foreach', 'for each', 'until']):
+            k = re.findall(r'(foreach|for each|until) (\w+)*', loop_while.replace('[', '').replace('(', ''))[0][1].replace(':', '')
+        else:
+            k = 'Loop'
+        label = 'l_' + k
+        return label, (k, loop_while)
+
+    def do_mod(e):
+        """
+        Returns the label and the Sequence Table row of the module.
+        """
+        label = e.find('./rm_properties/label').text
+        return label, get_sequence(e)
+
+    # appends roman numerals until the key is unique: k, k_i, k_ii, ...
+    unique_if_key = unique_labeler()
+    unique_loop_key = unique_labeler()
+
+    # collect the rows of all elements, one DataFrame per table is created after the walk
+    #dict_df = pandas.new_table_with_columns('KEY_TODO', 'LoopWhile', 'Logic', 'parent_type', 'parent_name', 'Branch', 'global_pos')
+    dict_if = {}
+    dict_loop = {}
+    question_answer_rows = []
+    response_rows = []
+    codelist_rows = []
+    sequence_rows = []
+
+    # 1. content of each element
+    items = []
+    for e, parent, own, pos in elements:
+        tag = e.tag.lower()
+        if tag == 'question':
+            if e.find('./method') is None or e.find('./method').attrib['name'] == 'computeiforask':
+                items.append((pos, tag, parent, own, get_question_response(e)))
+        elif tag == 'module':
+            items.append((pos, tag, parent, own, do_mod(e)))
+        elif tag == 'if':
+            items.append((pos, tag, parent, own, do_if(e)))
+        elif tag == 'loop':
+            items.append((pos, tag, parent, own, do_loop(e)))
+        else:
+            # raise RuntimeError('not handled yet')
+            #print('not handled yet: {}'.format(e.tag))
+            pass
+
+    # 2. keys and parents in document order, a parent always comes before its children
+    items.sort(key=lambda item: item[0])
+    for global_pos, tag, parent, own, (k, row, *codes) in items:
+        parent_type, parent_key, branch = get_useful_parent_info(parent)
+        if tag == 'question':
+            question_answer_rows.append(k + (parent_type, parent_key, branch, global_pos))
+            response_rows.extend(row)
+            codelist_rows.extend(codes[0])
+            continue
+        elif tag == 'module':
+            sequence_rows.append(row + ('CcSequence', parent_key, branch, global_pos))
+        elif tag == 'if':
+            k = unique_if_key(k)
+            dict_if[k] = row + (parent_type, parent_key, branch, global_pos)
+        elif tag == 'loop':
+            k = unique_loop_key(k)
+            dict_loop[k] = row + (parent_type, parent_key, branch, global_pos)
+        if own is not None:
+            own['MYKEY'] = k
+
+    df_appended_question_answer = pd.DataFrame(question_answer_rows, columns=QI_COLUMNS + PARENT_COLUMNS)
+    df_appended_response = pd.DataFrame(response_rows, columns=RESPONSE_COLUMNS)
+    df_appended_codelist = pd.DataFrame(codelist_rows, columns=CODELIST_COLUMNS)
+
+    df_appended_response = df_appended_response.drop_duplicates(keep = 'first', inplace=False)
+
+    # question long/short names
+#    print(df_appended_question_answer.head(1).transpose())
+#    dict_qi_names = dict(zip(df_appended_question_answer['QuestionLabel'].str.replace('qi_', ''), df_appended_question_answer['Label'].str.replace('qi_', '')))
+#    print(len(dict_qi_names))
+#    print(dict_qi_names.values())
+    df_qi_name_pos = df_appended_question_answer.loc[:, ['QuestionLabel', 'Label', 'global_pos']]
+    df_qi_name_pos['QuestionLabel'] = df_qi_name_pos['QuestionLabel'].str.replace('qi_', '')
+    df_qi_name_pos['Label'] = df_qi_name_pos['Label'].str.replace('qi_', '')
+
+    # question labels and the full question name used for each label in logic text:
+    # the question with the smallest logic position - global_pos, which is the last one with that label
+    qi_labels = set(df_qi_name_pos['Label'])
+    df_qi_last = df_qi_name_pos.sort_values('global_pos')
+    qi_full_name = dict(zip(df_qi_last['Label'], df_qi_last['QuestionLabel']))
+
+    df_appended_question_answer.drop('Label', axis=1, inplace=True)
+
+    # dict_if to df
+    df_condition = pd.DataFrame(dict_if).T.rename_axis('Label').add_prefix('Value').reset_index() 
+    df_condition.rename(columns={'Value0': 'Literal', 'Value1': 'Logic', 'Value2': 'Logic_q_names', 'Value3': 'parent_type', 'Value4': 'parent_name', 'Value5': 'Branch', 'Value6': 'global_pos'}, inplace=True)
+
+    # modify condition table logic field: if the question is not in the parsed questions, then delete that part in logic
+    # tmp = df_condition[['Label', 'Logic', 'Logic_q_names']]
+    df_condition['exist_q'] = df_condition['Logic_q_names'].apply(lambda x: [i in qi_labels for i in x])
+    df_condition['Logic_parts'] = df_condition['Logic'].apply(lambda x: re.findall('\w*\.*\w+[ ]{1,}==[ ]{1,}\w*\|*\w*\|*\w*\|*\w*\|*\w*\|*\w*\|*|\w*\.*\w+[ ]{1,}>[ ]{1,}\w*\|*\w*\|*\w*\|*\w*\|*\w*\|*\w*\|*|\w*\.*\w+[ ]{1,}<[ ]{1,}\w*\|*\w*\|*\w*\|*\w*\|*\w*\|*\w*\|*|\w*\.*\w+[ ]{1,}!=[ ]{1,}\w*\|*\w*\|*\w*\|*\w*\|*\w*\|*\w*\|*',x))
+    df_condition['Logic_new'] = df_condition.apply(lambda row: [row['Logic_parts'][i] for i, e in enumerate(row['exist_q']) if e == False and row['Logic_parts'] != []] if False in row['exist_q'] else row['Logic'], axis=1)
+
+    def replace_multiple_str(s, l):
+        """Replace item if a list with empty string"""
+        for item in l:
+            s = s.replace(item, '')
+        return s
+
+    # rename logic text: Condition logic referring to a question should match it exactly so qc_PERGRID == 0 should be qc_hhgrid_w4_pergrid == 0
+    def replace_logic_text(s, l):
+        """Replace each question label with its full question name"""
+        for item in l:
+            if item in qi_full_name:
+                s = s.replace(item, qi_full_name[item])
+        return s
+
+    df_condition['Logic_re'] = df_condition.apply(lambda row: replace_logic_text(row['Logic'], row['Logic_q_names']), axis=1)
+
+    df_condition['Logic_new_n'] = df_condition.apply(lambda row: '' if not True in row['exist_q'] else replace_logic_text(row['Logic_re'], row['Logic_q_names']) if all(x==True for x in row['exist_q']) else replace_multiple_str(row['Logic_re'], row['Logic_new']), axis=1)
+
+    df_condition['Logic_clean'] = df_condition['Logic_new_n'].apply(lambda x: re.sub('^ \$\$ |^ \|\| ', '', x))
+
+    # rename label: Conditions are labelled after the last part of the question e.g. c_qhhgrid_w4_pergrid should be c_qpergrid_i and c_qPERGRID should be c_qpergrid_ii.
+
+    df_condition.drop(['Logic', 'Logic_q_names', 'exist_q', 'Logic_parts', 'Logic_new', 'Logic_new_n'], axis=1, inplace=True)
+    df_condition.rename(columns={'Logic_clean': 'Logic'}, inplace=True)
+    df_condition = df_condition[['Label', 'Literal', 'Logic', 'parent_type', 'parent_name', 'Branch', 'global_pos']]
+
+    #df_condition.to_csv('TMP.csv', sep=';', index=False)
+
+    # dict_loop to df
+    df_loop = pd.DataFrame(dict_loop).T.rename_axis('Label').add_prefix('Value').reset_index() 
+    # print(df_loop.head())
+    df_loop.rename(columns={'Value0': 'Loop_Var', 'Value1': 'Loop_While', 'Value2': 'parent_type', 'Value3': 'parent_name', 'Value4': 'Branch', 'Value5': 'global_pos'}, inplace=True)
+
+    # sequence 
+    df_appended_sequence = pd.DataFrame(sequence_rows, columns=SEQUENCE_COLUMNS + PARENT_COLUMNS)
+    df_appended_sequence= df_appended_sequence.sort_values('global_pos')
+
+    # reset index
+    df_appended_question_answer.reset_index(drop=True, inplace=True)
+    df_appended_response.reset_index(drop=True, inplace=True)
+    df_appended_codelist.reset_index(drop=True, inplace=True)
+    df_condition.reset_index(drop=True, inplace=True)
+    df_appended_sequence.reset_index(drop=True, inplace=True)
+    df_loop.reset_index(drop=True, inplace=True)
+
+    return (df_appended_question_answer, df_appended_response, df_appended_codelist, df_condition, df_appended_sequence, df_loop)
+
+
+def update_position(df_qi, df_condition, df_loop, df_sequence):
+    """
+        Update the position from global position
+    """
+    df_qi_sub = df_qi.loc[:, ["QuestionLabel", "parent_type", "parent_name", "global_pos"]]
+    df_qi_sub.rename(columns={"QuestionLabel": "Label"})
+    df_condition_sub = df_condition.loc[:, ["Label", "parent_type", "parent_name", "global_pos"]]
+    df_loop_sub = df_loop.loc[:, ["Label", "parent_type", "parent_name", "global_pos"]]
+    df_sequence_sub = df_sequence.loc[:, ["Label", "parent_type", "parent_name", "global_pos"]]
+
+    # concat
+    pdList = [df_qi_sub, df_condition_sub, df_loop_sub, df_sequence_sub] 
+    df_pos = pd.concat(pdList)
+
+    # sort by global position
+    df_pos = df_pos.sort_values("global_pos")
+
+    df_pos["Position"] = df_pos.groupby(["parent_type", "parent_name"]).cumcount() + 1
+    # update position
+    df_qi['Position'] = df_qi['global_pos'].map(df_pos.set_index('global_pos')['Position'])
+    df_condition['Position'] = df_condition['global_pos'].map(df_pos.set_index('global_pos')['Position'])
+    df_loop['Position'] = df_loop['global_pos'].map(df_pos.set_index('global_pos')['Position'])
+    df_sequence['Position'] = df_sequence['global_pos'].map(df_pos.set_index('global_pos')['Position'])
+
+    df_qi.drop('global_pos', axis=1, inplace=True)
+    df_condition.drop('global_pos', axis=1, inplace=True)
+    df_loop.drop('global_pos', axis=1, inplace=True)
+    df_sequence.drop(['ModuleName', 'global_pos'], axis=1, inplace=True)
+
+    return df_qi, df_condition, df_loop, df_sequence
+
+
+def update_codelist(df_codelist, df_qi):
+    """
+        Update codelist, one codelist can be used for multiple questions
+    """
+
+    label_dict, df_codes_dict = dedupe_codelists(df_codelist, ['Order', 'Value', 'Category'])
+    # print("\n".join("{}\t{}".format(k, v) for k, v in label_dict.items()))
+
+    df_qi['Response'] = df_qi['Response'].map(label_dict).fillna(df_qi['Response'])
+
+    return df_codes_dict, df_qi
+
+
+def nested_loop_labels(df_qi, df_condition):
+    """
+        Loop labels from the question at position 1 of the loop,
+        or of a condition (or a condition in a condition) at position 1 of the loop
+    """
+    # loop then question
+    df_loop_qi = df_qi.loc[(df_qi.parent_type == 'CcLoop') & (df_qi.Position == 1), ['parent_name', 'QuestionLabel']]
+    df_loop_qi.rename(columns={'parent_name': 'old_label'}, inplace=True)
+    # if then question
+    df_if_qi = df_qi.loc[(df_qi.parent_type == 'CcCondition') & (df_qi.Position == 1), ['parent_name', 'QuestionLabel']]
+    # loop then if
+    df_loop_if = df_condition.loc[(df_condition.parent_type == 'CcLoop') & (df_condition.Position == 1), ['parent_name', 'Label']]
+    # if then if
+    df_if_if = df_condition.loc[(df_condition.parent_type == 'CcCondition') & (df_condition.Position == 1), ['parent_name', 'Label']]
+
+    # loop then if then question
+    df_loop_if_qi_m = df_loop_if.merge(df_if_qi, how='left', left_on = 'Label', right_on = 'parent_name')
+    df_loop_if_qi_m.rename(columns={'parent_name_x': 'old_label'}, inplace=True)
+    # one case of loop, if, if, question
+    df_loop_if_qi_mm = df_loop_if_qi_m.merge(df_if_if, how='left', left_on = 'Label', right_on = 'parent_name')
+    df_loop_if_qi_mmm = df_loop_if_qi_mm.merge(df_if_qi, how='left', left_on = 'Label_y', right_on = 'parent_name')
+    df_loop_if_qi_mmm['new_label'] = df_loop_if_qi_mmm.apply(lambda row: row['QuestionLabel_x'].replace('qi_', 'l_q') if not pd.isnull(row['QuestionLabel_x'])  else row['QuestionLabel_y'].replace('qi_', 'l_q'), axis = 1)
+
+    dict_loop_label1 = dict(zip(df_loop_if_qi_mmm['old_label'], df_loop_if_qi_mmm['new_label']))
+
+    df_loop_qi['new_label'] = df_loop_qi['QuestionLabel'].str.replace('qi_', 'l_q')
+    dict_loop_label = dict(zip(df_loop_qi['old_label'], df_loop_qi['new_label']))
+    # join both dict
+    dict_loop_label.update(dict_loop_label1)
+
+    for k in dict_loop_label.keys():
+        dict_loop_label[k] = 'l_q' + dict_loop_label[k].split('_')[-1]
+
+    #print("\n".join("{}\t{}".format(k, v) for k, v in dict_loop_label.items()))
+    return dict_loop_label
+
+
+def update_loop_condition_label(df_qi, df_condition, df_loop, loop_labels='first_question', capital_words=True):
+    """
+        Label is:
+            Loop: l_q + first question name
+            Condition: if no logic, c_q + first question name
+        loop_labels: 'first_question' follows the first child down to a question,
+                     'nested' only looks at the question, condition or condition in a condition at position 1 (wave 4)
+        capital_words: a condition without comparison is named after its first capitalised word, else its first word (wave 4)
+    """
+
+
+    # update condition label only if it has no logic text
+    def find_first_q(if_label, loop_label, df_condition, df_loop, df_qi):
+        #Given condition name, find it's first question name
+        question_name = ''
+
+        #i = 1
+        while question_name == '':
+            #print(i)
+            df_condition_sub = df_condition.loc[(df_condition.parent_type == 'CcCondition') & (df_condition.Position == 1) & (df_condition.parent_name == if_label), ['parent_name', 'Label']]
+            df_loop_sub = df_loop.loc[(df_loop.parent_type == 'CcCondition') & (df_loop.Position == 1) & (df_loop.parent_name == if_label),  ['parent_name', 'Label']]
+            df_qi_sub = df_qi.loc[(df_qi.parent_type == 'CcCondition') & (df_qi.Position == 1) & (df_qi.parent_name == if_label), ['parent_name', 'QuestionLabel']]
+
+            df_condition_sub1 = df_condition.loc[(df_condition.parent_type == 'CcLoop') & (df_condition.Position == 1) & (df_condition.parent_name == loop_label), ['parent_name', 'Label']]
+            df_loop_sub1 = df_loop.loc[(df_loop.parent_type == 'CcLoop') & (df_loop.Position == 1) & (df_loop.parent_name == loop_label),  ['parent_name', 'Label']]
+            df_qi_sub1 = df_qi.loc[(df_qi.parent_type == 'CcLoop') & (df_qi.Position == 1) & (df_qi.parent_name == loop_label), ['parent_name', 'QuestionLabel']]
+
+            if not df_condition_sub.empty:
+                if_label = df_condition_sub['Label'].values[0]
+                loop_label = ''
+                question_name == ''
+                #print('1 condition')
+            elif not df_loop_sub.empty:
+                loop_label = df_loop_sub['Label'].values[0]
+                if_label = ''
+                question_name == ''
+                #print('1 loop')
+            elif not df_qi_sub.empty:
+                question_name = df_qi_sub['QuestionLabel'].values[0]
+                #print('1 question')
+            elif not df_condition_sub1.empty:
+                if_label = df_condition_sub1['Label'].values[0]
+                loop_label = ''
+                question_name == ''
+                #print('2 condition')
+            elif not df_loop_sub1.empty:
+                loop_label = df_loop_sub1['Label'].values[0]
+                if_label = ''
+                question_name == ''
+                #print('2 loop')
+            elif not df_qi_sub1.empty:
+                question_name = df_qi_sub1['QuestionLabel'].values[0]
+                #print('3 question')
+            else:
+                #print('no first question?')
+                # print(if_label)
+                question_name = 'unknown'
+            #i = i + 1
+        return question_name
+
+    if loop_labels == 'nested':
+        dict_loop_label = nested_loop_labels(df_qi, df_condition)
+    else:
+        df_loop['first_question'] = df_loop.apply(lambda row: find_first_q('', row['Label'], df_condition, df_loop, df_qi) if row['Loop_While'] == '' else '', axis=1)
+
+        df_loop['new_label'] = df_loop.apply(lambda row: row['Label'] if row['first_question'] == 'unknown' else row['Label'] if row['first_question'] == '' else 'l_q' + row['first_question'].split('_')[-1], axis=1)
+
+        dict_loop_label = dict(zip(df_loop['Label'], df_loop['new_label']))
+        df_loop.drop(['first_question', 'new_label'], axis=1, inplace=True)
+ 
+        debug_artifacts.dump('loops', df_loop, 'TMP1.csv', sep=';', index=False)
+
+    # update loop labels
+    df_qi['parent_name'] = df_qi['parent_name'].map(dict_loop_label).fillna(df_qi['parent_name'])
+    df_condition['parent_name'] = df_condition['parent_name'].map(dict_loop_label).fillna(df_condition['parent_name'])
+    df_loop['parent_name'] = df_loop['parent_name'].map(dict_loop_label).fillna(df_loop['parent_name'])
+    df_loop['Label'] = df_loop['Label'].map(dict_loop_label).fillna(df_loop['Label'])
+
+
+
+    def relabel_if(logic):
+
+        if any(ext in logic for ext in ['==', '!=', '<', '>']):
+            l = re.findall(r'(\w*\.*\w+) *(==|!=|>|<)', logic)
+            if l != []:
+                k_all = [item[0] for item in l]
+                k = l[0][0]
+            else:
+                all_capital_words = [word for word in logic.split(' ') if word[0].isupper() or not capital_words]
+                if all_capital_words == []:
+                    k = logic.split(' ')[0]
+                else:
+                    k = all_capital_words[0]
+                k_all = [k]
+        else:
+            all_capital_words = [word for word in logic.split(' ') if word[0].isupper() or not capital_words]
+            if all_capital_words == []:
+                k = logic.split(' ')[0]
+            else:
+                k = all_capital_words[0]   
+
+            k_all = [k]
+
+        k = 'c_q' + k.replace('.','_').split('_')[-1]
+        return k
+
+    df_condition['first_question'] = df_condition.apply(lambda row: find_first_q(row['Label'], '', df_condition, df_loop, df_qi) if row['Logic'] == '' else '', axis=1)
+
+    df_condition['new_label'] = df_condition.apply(lambda row: row['Label'] if row['first_question'] == 'unknown' else relabel_if(row['Logic']) if row['first_question'] == '' else 'c_q' + row['first_question'].split('_')[-1], axis=1)
+
+    df_condition['new_label_roman'] = suffix_duplicates(df_condition['new_label'])
+
+    dict_if_label = dict(zip(df_condition['Label'], df_condition['new_label_roman']))
+    df_condition.drop(['first_question', 'new_label', 'new_label_roman'], axis=1, inplace=True)
+ 
+
+    # update condition labels
+    df_qi['parent_name'] = df_qi['parent_name'].map(dict_if_label).fillna(df_qi['parent_name'])
+    df_condition['parent_name'] = df_condition['parent_name'].map(dict_if_label).fillna(df_condition['parent_name'])
+    df_loop['parent_name'] = df_loop['parent_name'].map(dict_if_label).fillna(df_loop['parent_name'])
+    df_condition['Label'] = df_condition['Label'].map(dict_if_label).fillna(df_condition['Label'])
+
+
+    return df_qi, df_condition, df_loop
+
+
+def manual_fix(df_sequence, main_name, fix=None):
+    """
+    Manually modify sequence order:
+        fix['insert'] is added as a new sequence at fix['insert_at'] (a position between two rows of df_sequence),
+        the sequences in fix['top_level'] belong to main_name, all others to fix['parent']
+    without a fix the layout is kept, the sequences without a parent belong to main_name
+    """
+
+    df_sequence.reset_index(drop=True, inplace=True)
+
+    if not fix:
+        df = df_sequence.copy()
+        df['parent_name'] = df['parent_name'].fillna(main_name)
+        df['Position'] = df.groupby(['parent_name']).cumcount() + 1
+        return df
+
+    df_line = pd.DataFrame({'Label': fix['insert'], 
+                         'parent_type': 'CcSequence',
+                         'parent_name': main_name,
+                         'branch': 1,
+                         'Position': None}, 
+                        index=[fix['insert_at']])
+
+    df = df_sequence.append(df_line, ignore_index=False)
+    df = df.sort_index().reset_index(drop=True)
+
+    top_level = set(fix['top_level'])
+    df['parent_name'] = df['Label'].apply(lambda x: fix['parent'] if x not in top_level else main_name)
+    df['Position'] = df.groupby(['parent_name']).cumcount() + 1
+    return df
+
+
+def load_config(wave, config_dir=CONFIG_DIR):
+    """
+    Read the per wave settings from us_config/wave<N>.json
+    """
+    with open(os.path.join(config_dir, 'wave{}.json'.format(wave)), 'rt') as f:
+        return json.load(f)
+
+
+def config_for_file(xmlFile, config_dir=CONFIG_DIR):
+    """
+    Settings for a qsrx file: the wave config with the same file name, read from the directory of xmlFile,
+    or the settings of the latest wave with the name taken from the file (main06.specification... -> main06)
+    and no sequence_fix, the module layout of another wave is not applied to a new one
+    """
+    configs = [load_config(int(name[4:-5]), config_dir) for name in sorted(os.listdir(config_dir))
+               if name.startswith('wave') and name.endswith('.json')]
+    configs.sort(key=lambda c: c['wave'])
+
+    xml = os.path.basename(xmlFile)
+    matches = [c for c in configs if c['xml'] == xml]
+    config = dict(matches[0] if matches else configs[-1])
+    if not matches:
+        config['wave'] = None
+        config['name'] = xml.split('.')[0]
+        config['xml'] = xml
+        config['sequence_fix'] = None
+        print('{}: no us_config wave for this file, using the wave {} settings without a sequence fix '
+              '(pass --config for a per wave sequence_fix)'.format(xml, configs[-1]['wave']))
+    config['input_dir'] = os.path.dirname(xmlFile)
+    return config
+
+
+def parse_wave(config):
+    """
+    Parse the qsrx file of one wave and write its archivist tables to input_dir/output_dir,
+    returns the code lists and response domains of the wave, with the seconds spent on each step
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    input_dir = config['input_dir']
+    xmlFile = os.path.join(input_dir, config['xml'])
+
+    output_dir = os.path.join(input_dir, config['output_dir'])
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if config.get('streaming', False):
+        elements = iterparse_useful_parent(xmlFile)
+    else:
+        tree = ET.parse(xmlFile)
+        root = tree.getroot()
+        elements = iter_useful_parent(root)
+
+    df_qi, df_response, df_codelist, df_condition, df_sequence, df_loop = TreeToTables(elements)
+    timings['parse'] = time.perf_counter() - start
+
+    df_qi, df_condition, df_loop, df_sequence = update_position(df_qi, df_condition, df_loop, df_sequence)
+    # df_qi.to_csv(os.path.join(output_dir, 'question_items_TMP.csv'), encoding='utf-8', sep=';', index=False)
+
+    # same codelist can be used for multiple questions
+    df_codes_dict, df_qi = update_codelist(df_codelist, df_qi)
+
+    # update loop and if labels: use first question name
+    df_qi, df_condition, df_loop = update_loop_condition_label(df_qi, df_condition, df_loop, config['loop_labels'], config['capital_words'])
+
+    # manual fix the sequence layout, only with a sequence_fix of this wave
+    df_sequence = manual_fix(df_sequence, config['name'], config.get('sequence_fix'))
+
+    # literal cannot be empty 
+    df_condition['Literal'] = df_condition['Literal'].apply(lambda x: 'CHECK' if x=='' else x)
+    timings['tables'] = time.perf_counter() - start - timings['parse']
+
+    df_qi.to_csv(os.path.join(output_dir, 'question_items.csv'), encoding='utf-8', sep=';', index=False)
+    df_response.to_csv(os.path.join(output_dir, 'response.csv'), encoding='utf-8', sep=';', index=False)
+    df_codes_dict.to_csv(os.path.join(output_dir, 'codes.csv'), encoding='utf-8', sep=';', index=False)
+    df_condition.to_csv(os.path.join(output_dir, 'conditions.csv'), encoding='utf-8', sep=';', index=False)
+    df_loop.to_csv(os.path.join(output_dir, 'loops.csv'), encoding='utf-8', sep=';', index=False)
+    df_sequence.to_csv(os.path.join(output_dir, 'sequences.csv'), encoding='utf-8', sep=';', index=False)
+    debug_artifacts.flush()
+    timings['write'] = time.perf_counter() - start - timings['parse'] - timings['tables']
+
+    return {'name': config['name'], 'codes': df_codes_dict, 'response': df_response, 'timings': timings}
+
+
+def shared_domains(results):
+    """
+    One dedupe pass over the code lists and response domains of all waves:
+        codes: the distinct code lists, named after the first wave using them (main04/cs_x) or cs_Yes_No
+        codes_map: wave, Label in the wave, shared Label
+        response: the distinct response domains with the waves using them
+    """
+    df_codes = pd.concat([r['codes'].assign(Label=r['name'] + '/' + r['codes']['Label']) for r in results], ignore_index=True)
+    label_map, df_shared_codes = dedupe_codelists(df_codes, ['Order', 'Value', 'Category'])
+
+    df_codes_map = pd.DataFrame([old.split('/', 1) + [new] for old, new in label_map.items()],
+                                columns=['Wave', 'Label', 'Shared_Label'])
+
+    df_response = pd.concat([r['response'].assign(Wave=r['name']) for r in results], ignore_index=True)
+    domain = RESPONSE_COLUMNS
+    df_shared_response = df_response.groupby(domain, sort=False, dropna=False)['Wave'].agg(','.join).reset_index()
+    df_shared_response.rename(columns={'Wave': 'Waves'}, inplace=True)
+
+    return {'codes': df_shared_codes, 'codes_map': df_codes_map, 'response': df_shared_response}
+
+
+def run(config):
+    """
+    Parse one wave and write its archivist tables
+    """
+    return run_waves([config])[0]
+
+
+def run_waves(configs, workers=None, shared_dir=None):
+    """
+    Parse several waves, one task per qsrx file so the waves are spread over a process pool
+    when workers is not 1 (0 means one per cpu).
+    When shared_dir is given the code lists and response domains of all waves are deduplicated
+    in one pass and written there (shared_codes.csv, shared_codes_map.csv, shared_response.csv)
+    """
+    if workers is not None and workers != 1 and len(configs) > 1:
+        with ProcessPoolExecutor(max_workers=workers or None) as executor:
+            results = list(executor.map(parse_wave, configs))
+    else:
+        results = [parse_wave(config) for config in configs]
+
+    if shared_dir is not None:
+        start = time.perf_counter()
+        shared = shared_domains(results)
+        if not os.path.exists(shared_dir):
+            os.makedirs(shared_dir)
+        shared['codes'].to_csv(os.path.join(shared_dir, 'shared_codes.csv'), encoding='utf-8', sep=';', index=False)
+        shared['codes_map'].to_csv(os.path.join(shared_dir, 'shared_codes_map.csv'), encoding='utf-8', sep=';', index=False)
+        shared['response'].to_csv(os.path.join(shared_dir, 'shared_response.csv'), encoding='utf-8', sep=';', index=False)
+        results.append({'name': 'shared', 'timings': {'dedupe': time.perf_counter() - start}})
+
+    return results
+
+
+def timing_report(results):
+    """
+    one line per wave: total seconds and the seconds of each step
+    """
+    lines = []
+    for r in results:
+        steps = ', '.join('{} {:.2f}s'.format(k, v) for k, v in r['timings'].items())
+        lines.append('{}: {:.2f}s ({})'.format(r['name'], sum(r['timings'].values()), steps))
+    return '\n'.join(lines)